@@ -1,3 +1,5 @@
+import os
+import random
 import traceback  # Import traceback để in lỗi chi tiết
 from fastapi import FastAPI
 from pydantic import BaseModel
@@ -5,16 +7,18 @@ from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 
 from position import Position
-from moves import generate_legal_moves, Move
+from moves import generate_legal_moves, iter_legal_moves, Move
 from search import Search
 from eval import evaluate
 from uci import move_to_uci
 
 app = FastAPI(title="ZetaChess API", version="1.0")
 searcher = Search()
+# Comma-separated list of allowed origins; defaults to wildcard for local dev
+_origins = os.environ.get('ZETACHESS_ALLOW_ORIGINS', '*')
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=[o.strip() for o in _origins.split(',')],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -41,14 +45,17 @@ def get_move(request: FenRequest):
     except Exception as e:
         return {"status": "error", "reason": f"Invalid FEN: {e}"}
 
-    legal_moves = generate_legal_moves(pos)
-    if not legal_moves:
-        return {"status": "game_over", "reason": "No legal moves"}
-
-    # Random move
+    # Random move: reservoir-sample from the generator so we never build
+    # the full legal-move list for this path
     if request.method == "random":
-        import random
-        move = random.choice(legal_moves)
+        move = None
+        seen = 0
+        for m in iter_legal_moves(pos):
+            seen += 1
+            if random.randrange(seen) == 0:
+                move = m
+        if move is None:
+            return {"status": "game_over", "reason": "No legal moves"}
         pos.make_move(move)
         return {
             "status": "ok",
@@ -57,21 +64,19 @@ def get_move(request: FenRequest):
             "fen_after": pos.to_fen(),
         }
 
+    legal_moves = generate_legal_moves(pos)
+    if not legal_moves:
+        return {"status": "game_over", "reason": "No legal moves"}
+
     # Best move (search)
     depth = max(1, request.depth or 3)
-    
-    # === KHỐI DEBUG ĐƯỢC THÊM VÀO ===
+
     try:
         best_move, best_eval, _ = searcher.search(pos, depth)
     except Exception as e:
-        tb_str = traceback.format_exc()
-        # In lỗi ra terminal của uvicorn
-        print(f"!!!!!!!!!!!!!!! LỖI TRONG HÀM SEARCH !!!!!!!!!!!!!!!")
-        print(tb_str)
-        print(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         # Trả lỗi chi tiết về cho frontend
+        tb_str = traceback.format_exc()
         return {"status": "error", "reason": f"Search failed: {e}", "traceback": tb_str}
-    # ==================================
 
     if best_move is None:
         return {"status": "error", "reason": "No move found"}
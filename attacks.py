@@ -1,3 +1,4 @@
+from array import array
 from typing import List
 
 WHITE, BLACK = 0, 1
@@ -12,10 +13,11 @@ KING_DELTAS = [
     (1, -1),  (1, 0),  (1, 1),
 ]
 
-# Precomputed masks
-KNIGHT_ATTACKS: List[int] = [0] * 64
-KING_ATTACKS: List[int] = [0] * 64
-PAWN_ATTACKS = [[0] * 64 for _ in range(2)]  # [side][sq]
+# Precomputed masks; array('Q') keeps them as packed 64-bit words instead
+# of boxed ints. PAWN_ATTACKS is flat, indexed (side << 6) | sq.
+KNIGHT_ATTACKS = array('Q', [0] * 64)
+KING_ATTACKS = array('Q', [0] * 64)
+PAWN_ATTACKS = array('Q', [0] * 128)
 
 
 def _sq(file_idx: int, rank_idx: int) -> int:
@@ -51,7 +53,7 @@ for sq in range(64):
             wm |= 1 << _sq(f - 1, r + 1)
         if f + 1 < 8:
             wm |= 1 << _sq(f + 1, r + 1)
-    PAWN_ATTACKS[WHITE][sq] = wm
+    PAWN_ATTACKS[sq] = wm
     # Black: down-left, down-right
     bm = 0
     if r - 1 >= 0:
@@ -59,10 +61,38 @@ for sq in range(64):
             bm |= 1 << _sq(f - 1, r - 1)
         if f + 1 < 8:
             bm |= 1 << _sq(f + 1, r - 1)
-    PAWN_ATTACKS[BLACK][sq] = bm
+    PAWN_ATTACKS[64 + sq] = bm
 
 
-def rook_attacks(sq: int, occ: int) -> int:
+# Reverse view for attack tests: PAWN_ATTACKERS[(side << 6) | sq] is the
+# set of squares from which a pawn of `side` attacks sq — which is just
+# the opposite side's attack pattern from sq.
+PAWN_ATTACKERS = array('Q', [0] * 128)
+for sq in range(64):
+    PAWN_ATTACKERS[sq] = PAWN_ATTACKS[64 + sq]
+    PAWN_ATTACKERS[64 + sq] = PAWN_ATTACKS[sq]
+
+
+# BETWEEN[(a << 6) | b]: squares strictly between a and b when they share
+# a rank, file or diagonal, else 0. Used for pin rays and check blocking.
+BETWEEN = array('Q', [0] * 4096)
+for sq in range(64):
+    _f = sq % 8
+    _r = sq // 8
+    for df, dr in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+        bm = 0
+        nf = _f + df
+        nr = _r + dr
+        while 0 <= nf < 8 and 0 <= nr < 8:
+            t = _sq(nf, nr)
+            BETWEEN[(sq << 6) | t] = bm
+            bm |= 1 << t
+            nf += df
+            nr += dr
+
+
+def _rook_attacks_slow(sq: int, occ: int) -> int:
+    # Classical ray scan; used only to build the magic tables below
     attacks = 0
     f = sq % 8
     r = sq // 8
@@ -93,48 +123,124 @@ def rook_attacks(sq: int, occ: int) -> int:
     return attacks
 
 
-def bishop_attacks(sq: int, occ: int) -> int:
+def _bishop_attacks_slow(sq: int, occ: int) -> int:
+    # Classical ray scan; used only to build the magic tables below
     attacks = 0
     f = sq % 8
     r = sq // 8
-    # NE
-    nf, nr = f + 1, r + 1
-    while _in_board(nf, nr):
-        nsq = _sq(nf, nr)
-        attacks |= 1 << nsq
-        if (occ >> nsq) & 1:
-            break
-        nf += 1
-        nr += 1
-    # NW
-    nf, nr = f - 1, r + 1
-    while _in_board(nf, nr):
-        nsq = _sq(nf, nr)
-        attacks |= 1 << nsq
-        if (occ >> nsq) & 1:
-            break
-        nf -= 1
-        nr += 1
-    # SE
-    nf, nr = f + 1, r - 1
-    while _in_board(nf, nr):
-        nsq = _sq(nf, nr)
-        attacks |= 1 << nsq
-        if (occ >> nsq) & 1:
-            break
-        nf += 1
-        nr -= 1
-    # SW
-    nf, nr = f - 1, r - 1
-    while _in_board(nf, nr):
-        nsq = _sq(nf, nr)
-        attacks |= 1 << nsq
-        if (occ >> nsq) & 1:
-            break
-        nf -= 1
-        nr -= 1
+    for df, dr in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
+        nf, nr = f + df, r + dr
+        while _in_board(nf, nr):
+            nsq = _sq(nf, nr)
+            attacks |= 1 << nsq
+            if (occ >> nsq) & 1:
+                break
+            nf += df
+            nr += dr
     return attacks
 
 
+# --- Magic bitboards for sliding attacks ---
+# Each lookup is (occ & mask) * magic >> shift into a per-square table,
+# replacing the ray scans above on the hot path. The magic constants were
+# found offline by random search against the ray-scan reference.
+
+ROOK_MAGICS = (
+    0x0880004000A01282, 0x7440100040002000, 0x0200104020098200, 0x2080100006080080,
+    0x218006080080FC00, 0xC100010008220C00, 0xA280020001000080, 0x1280004163000180,
+    0x20A0800098244000, 0x0000402010004000, 0x0010802000100080, 0x3802000A00411022,
+    0x0201800400820800, 0x0000800200802400, 0x0004008410080249, 0x04008010C1000080,
+    0x0602818000400020, 0x0020004000205008, 0x0200110020030040, 0x08D0808010008804,
+    0x0C01010004500800, 0x8010818004000A00, 0x0000040061081210, 0x0000A20000904904,
+    0x0020C10A00208200, 0x40A8400080200080, 0x0C20008080100028, 0x0300180480100080,
+    0x0001080100145100, 0xD630400801200410, 0x0011220C00100108, 0x4424800480024100,
+    0x1240094080800020, 0x8000200180804001, 0x048480A000801000, 0x5008800802801000,
+    0x0010801401800800, 0x0200800400800200, 0x0000100804000243, 0x1080128102000044,
+    0x0000208040048000, 0x002102C002910020, 0x4010C08252060020, 0x0040410A00120020,
+    0x2802240008008080, 0x4200020004008080, 0x0012480150440002, 0x0330008064020019,
+    0x4180008120400080, 0x0000802000400080, 0x0250200010048080, 0x0211100028210100,
+    0x4442001009200600, 0x08C0800201040080, 0x904C10060748A400, 0x8000800300084080,
+    0x4210C11100800261, 0x0000203504834001, 0x1000700900200343, 0x0000B00008242101,
+    0x1A01000402080011, 0x0041000400020821, 0x0000062810088104, 0x2006004184A10402,
+)
+BISHOP_MAGICS = (
+    0x1408020802040011, 0x0005011204010220, 0x8808420052020040, 0x1008208030008006,
+    0x1084050481800000, 0x4042085444030002, 0x0026280134100480, 0x0000620804110820,
+    0x2824A0020C0B2400, 0x0004040108021180, 0x0010100702016080, 0x1040090401010103,
+    0x4210820211004140, 0x040088C420200800, 0x7001112108424000, 0x004221804402A000,
+    0x0024601020020400, 0x0408002022040040, 0x0081281000420040, 0x0204000202120240,
+    0x0005000820080040, 0x0004210200842040, 0x80020204029C4C10, 0x80008002020A8200,
+    0x0294101404600800, 0x1821240121080200, 0x0008209050010240, 0x5040040404410020,
+    0x0100840000802011, 0x0045010042100284, 0x00024E0000480204, 0x0044012025010108,
+    0x1001A03880200800, 0x00026120020C0804, 0x2000209000080821, 0x18090A0080080081,
+    0x02C0084100021100, 0x020118020000E208, 0x0044140384104800, 0xA104040061008894,
+    0x104D053840702040, 0x0001009014081002, 0x0404A02030002801, 0x0000604200880800,
+    0x0000080105402400, 0x130202810B002204, 0x00A0080140440700, 0x0048510C00801220,
+    0x7081089024200700, 0x0000440098090441, 0x4020860603044415, 0x0400014542021400,
+    0x0000101002020000, 0x0002400314110049, 0x111820A88081000A, 0x0214040806017401,
+    0x0001012084200800, 0x3000002401080800, 0x0302300201044904, 0x0101008000840442,
+    0xC002000304504404, 0x0800202004A10200, 0x0080202810228382, 0x8240420604010030,
+)
+
+_M64 = (1 << 64) - 1
+
+
+def _edge_trimmed_mask(sq: int, rook: bool) -> int:
+    f = sq % 8
+    r = sq // 8
+    m = 0
+    if rook:
+        for nf in range(f + 1, 7):
+            m |= 1 << _sq(nf, r)
+        for nf in range(1, f):
+            m |= 1 << _sq(nf, r)
+        for nr in range(r + 1, 7):
+            m |= 1 << _sq(f, nr)
+        for nr in range(1, r):
+            m |= 1 << _sq(f, nr)
+    else:
+        for df, dr in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
+            nf, nr = f + df, r + dr
+            while 0 < nf < 7 and 0 < nr < 7:
+                m |= 1 << _sq(nf, nr)
+                nf += df
+                nr += dr
+    return m
+
+
+def _build_magic_tables(magics, rook: bool):
+    masks = []
+    shifts = []
+    tables = []
+    slow = _rook_attacks_slow if rook else _bishop_attacks_slow
+    for sq in range(64):
+        mask = _edge_trimmed_mask(sq, rook)
+        magic = magics[sq]
+        shift = 64 - mask.bit_count()
+        table = [0] * (1 << mask.bit_count())
+        sub = 0
+        while True:
+            table[((sub * magic) & _M64) >> shift] = slow(sq, sub)
+            sub = (sub - mask) & mask
+            if sub == 0:
+                break
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return masks, shifts, tables
+
+
+ROOK_MASKS, ROOK_SHIFTS, ROOK_TABLES = _build_magic_tables(ROOK_MAGICS, rook=True)
+BISHOP_MASKS, BISHOP_SHIFTS, BISHOP_TABLES = _build_magic_tables(BISHOP_MAGICS, rook=False)
+
+
+def rook_attacks(sq: int, occ: int) -> int:
+    return ROOK_TABLES[sq][(((occ & ROOK_MASKS[sq]) * ROOK_MAGICS[sq]) & _M64) >> ROOK_SHIFTS[sq]]
+
+
+def bishop_attacks(sq: int, occ: int) -> int:
+    return BISHOP_TABLES[sq][(((occ & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq]) & _M64) >> BISHOP_SHIFTS[sq]]
+
+
 def queen_attacks(sq: int, occ: int) -> int:
     return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
\ No newline at end of file
@@ -1,4 +1,16 @@
 WHITE, BLACK = 0, 1
 
 # Castling rights bit flags
-CR_WK, CR_WQ, CR_BK, CR_BQ = 1, 2, 4, 8
\ No newline at end of file
+CR_WK, CR_WQ, CR_BK, CR_BQ = 1, 2, 4, 8
+
+# CR_MASK[sq]: rights that survive when sq is touched (from or to).
+# Only the king/rook home squares remove anything.
+CR_MASK = [0xF] * 64
+CR_MASK[0] &= ~CR_WQ
+CR_MASK[4] &= ~(CR_WK | CR_WQ)
+CR_MASK[7] &= ~CR_WK
+CR_MASK[56] &= ~CR_BQ
+CR_MASK[60] &= ~(CR_BK | CR_BQ)
+CR_MASK[63] &= ~CR_BK
+
+INITIAL_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
\ No newline at end of file
@@ -1,28 +1,20 @@
 from typing import Tuple
 
 WHITE, BLACK = 0, 1
-from attacks import KNIGHT_ATTACKS, KING_ATTACKS, rook_attacks, bishop_attacks, queen_attacks
+from attacks import PAWN_ATTACKS, KNIGHT_ATTACKS, KING_ATTACKS, rook_attacks, bishop_attacks, queen_attacks
 from moves import is_square_attacked_by
 
 # Piece values (centipawns) indexed by base type: P, N, B, R, Q, K
 PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+# Signed per-piece-index values (white positive, black negative)
+SIGNED_VAL = tuple(PIECE_VALUES) + tuple(-v for v in PIECE_VALUES)
+# Unsigned values over all 12 piece indices: PV12[p] == PIECE_VALUES[p % 6]
+PV12 = tuple(PIECE_VALUES) * 2
 
-# Phase weights (Stockfish-style, simplified)
-PHASE_WEIGHTS = {
-    1: 1,  # N
-    2: 1,  # B
-    3: 2,  # R
-    4: 4,  # Q
-}
+# Phase weights (Stockfish-style, simplified), per piece index P,N,B,R,Q,K
+PHASE_W = (0, 1, 1, 2, 4, 0) * 2
 MAX_PHASE = 24  # 2*(1+1+2+4) * (two sides)
-
-
-def _iter_bits(bb: int):
-    while bb:
-        lsb = bb & -bb
-        sq = lsb.bit_length() - 1
-        yield sq
-        bb &= bb - 1
+BOARD_MASK = (1 << 64) - 1
 
 
 def mirror_sq(sq: int) -> int:
@@ -38,6 +30,7 @@ def _center_dist(f: int, r: int) -> int:
 
 
 def _pst_white(piece_base: int, sq: int, endgame: bool) -> int:
+    # Import-time builder only; runtime lookups go through PST_MG/PST_EG
     f, r = sq % 8, sq // 8
     cd = _center_dist(f, r)
     if piece_base == 0:  # Pawn
@@ -59,220 +52,305 @@ def _pst_white(piece_base: int, sq: int, endgame: bool) -> int:
     return 0
 
 
-def pst(piece_index: int, sq: int, endgame: bool) -> int:
-    base = piece_index % 6
-    if piece_index <= 5:  # white piece
-        return _pst_white(base, sq, endgame)
-    else:
-        # use mirrored square for black perspective
-        return _pst_white(base, mirror_sq(sq), endgame)
+# Precomputed PST tables, indexed [piece_index][sq], sign folded in
+# (white positive, black negative). Built once at import from _pst_white.
+PST_MG = [[0] * 64 for _ in range(12)]
+PST_EG = [[0] * 64 for _ in range(12)]
+for _p in range(12):
+    for _sq in range(64):
+        _view_sq = _sq if _p <= 5 else mirror_sq(_sq)
+        _sign = 1 if _p <= 5 else -1
+        PST_MG[_p][_sq] = _sign * _pst_white(_p % 6, _view_sq, False)
+        PST_EG[_p][_sq] = _sign * _pst_white(_p % 6, _view_sq, True)
+del _p, _sq, _view_sq, _sign
 
 
 def _material_score(pos) -> int:
-    score = 0
+    return sum(SIGNED_VAL[p] * pos.bitboards[p].bit_count() for p in range(12))
+
+
+def _material_and_phase(pos) -> Tuple[int, int]:
+    # One pass over the 12 bitboards: each popcount feeds both the signed
+    # material sum and the game-phase accumulator.
+    mat = 0
+    phase = 0
+    bbs = pos.bitboards
     for p in range(12):
-        base = p % 6
-        val = PIECE_VALUES[base]
-        count = 0
+        c = bbs[p].bit_count()
+        mat += SIGNED_VAL[p] * c
+        phase += PHASE_W[p] * c
+    # Raw (unclamped) so it stays consistent under incremental updates;
+    # consumers clamp to MAX_PHASE before blending
+    return mat, phase
+
+
+# Pawn-structure cache: pawn PSTs depend only on the two pawn bitboards,
+# which change rarely during search, so both MG and EG pawn components are
+# memoized under a cheap Zobrist-like mix of (wp, bp).
+_PAWN_CACHE_SIZE = 1 << 16
+_PAWN_CACHE_MASK = _PAWN_CACHE_SIZE - 1
+_PAWN_CACHE_KEYS = [0] * _PAWN_CACHE_SIZE
+_PAWN_CACHE_VALS = [(0, 0)] * _PAWN_CACHE_SIZE
+_PAWN_K1 = 0x9E3779B97F4A7C15
+_PAWN_K2 = 0xC2B2AE3D27D4EB4F
+_MASK64 = (1 << 64) - 1
+
+
+def _pawn_pst(pos) -> Tuple[int, int]:
+    wp = pos.bitboards[0]
+    bp = pos.bitboards[6]
+    key = ((wp * _PAWN_K1) ^ (bp * _PAWN_K2)) & _MASK64
+    idx = key & _PAWN_CACHE_MASK
+    if _PAWN_CACHE_KEYS[idx] == key:
+        return _PAWN_CACHE_VALS[idx]
+    mg = 0
+    eg = 0
+    for p in (0, 6):
+        mg_row = PST_MG[p]
+        eg_row = PST_EG[p]
         bb = pos.bitboards[p]
         while bb:
-            bb &= bb - 1
-            count += 1
-        if p <= 5:
-            score += val * count
-        else:
-            score -= val * count
-    return score
+            lsb = bb & -bb
+            sq = lsb.bit_length() - 1
+            mg += mg_row[sq]
+            eg += eg_row[sq]
+            bb ^= lsb
+    _PAWN_CACHE_KEYS[idx] = key
+    _PAWN_CACHE_VALS[idx] = (mg, eg)
+    return mg, eg
 
 
 def _pst_score(pos, endgame: bool) -> int:
-    s = 0
-    for p in range(12):
+    table = PST_EG if endgame else PST_MG
+    pawn_mg, pawn_eg = _pawn_pst(pos)
+    s = pawn_eg if endgame else pawn_mg
+    for p in (1, 2, 3, 4, 5, 7, 8, 9, 10, 11):
+        row = table[p]
         bb = pos.bitboards[p]
-        for sq in _iter_bits(bb):
-            s += pst(p, sq, endgame) if p <= 5 else -pst(p, sq, endgame)
+        while bb:
+            lsb = bb & -bb
+            s += row[lsb.bit_length() - 1]
+            bb ^= lsb
     return s
 
 
 def _mobility_score(pos) -> int:
-    # Lightweight mobility for N/B/R/Q
-    own = pos.white_occupancy
-    opp = pos.black_occupancy
-    if pos.side_to_move == BLACK:
-        own, opp = opp, own
+    # Lightweight mobility for N/B/R/Q, one fused loop per color
     occ = pos.all_occupancy
-    def count_bits(bb: int) -> int:
-        c = 0
+    bbs = pos.bitboards
+    scores = [0, 0]
+    for color in (WHITE, BLACK):
+        own = pos.white_occupancy if color == WHITE else pos.black_occupancy
+        # Mask to 64 bits so ~own stays a non-negative board-sized int
+        not_own = ~own & BOARD_MASK
+        base = 0 if color == WHITE else 6
+        s = 0
+        bb = bbs[base + 1]  # N
         while bb:
-            bb &= bb - 1
-            c += 1
-        return c
-    score_w = 0
-    score_b = 0
-    # White
-    for sq in _iter_bits(pos.bitboards[1]):  # N
-        score_w += count_bits(KNIGHT_ATTACKS[sq] & ~own)
-    for sq in _iter_bits(pos.bitboards[2]):
-        score_w += count_bits(bishop_attacks(sq, occ) & ~own)
-    for sq in _iter_bits(pos.bitboards[3]):
-        score_w += count_bits(rook_attacks(sq, occ) & ~own)
-    for sq in _iter_bits(pos.bitboards[4]):
-        score_w += count_bits(queen_attacks(sq, occ) & ~own)
-    # Black
-    own_b = pos.black_occupancy
-    for sq in _iter_bits(pos.bitboards[7]):
-        score_b += count_bits(KNIGHT_ATTACKS[sq] & ~own_b)
-    for sq in _iter_bits(pos.bitboards[8]):
-        score_b += count_bits(bishop_attacks(sq, occ) & ~own_b)
-    for sq in _iter_bits(pos.bitboards[9]):
-        score_b += count_bits(rook_attacks(sq, occ) & ~own_b)
-    for sq in _iter_bits(pos.bitboards[10]):
-        score_b += count_bits(queen_attacks(sq, occ) & ~own_b)
+            lsb = bb & -bb
+            s += (KNIGHT_ATTACKS[lsb.bit_length() - 1] & not_own).bit_count()
+            bb ^= lsb
+        bb = bbs[base + 2]  # B
+        while bb:
+            lsb = bb & -bb
+            s += (bishop_attacks(lsb.bit_length() - 1, occ) & not_own).bit_count()
+            bb ^= lsb
+        bb = bbs[base + 3]  # R
+        while bb:
+            lsb = bb & -bb
+            s += (rook_attacks(lsb.bit_length() - 1, occ) & not_own).bit_count()
+            bb ^= lsb
+        bb = bbs[base + 4]  # Q
+        while bb:
+            lsb = bb & -bb
+            s += (queen_attacks(lsb.bit_length() - 1, occ) & not_own).bit_count()
+            bb ^= lsb
+        scores[color] = s
     # weights
-    return 2 * (score_w - score_b)
+    return 2 * (scores[WHITE] - scores[BLACK])
+
+
+def _attacked_squares(pos, side: int) -> int:
+    # Bitboard of every square attacked by `side` (O(pieces), one pass)
+    occ = pos.all_occupancy
+    bbs = pos.bitboards
+    base = 0 if side == WHITE else 6
+    atk = 0
+    pawn_atk = PAWN_ATTACKS
+    pawn_base = side << 6
+    bb = bbs[base]
+    while bb:
+        lsb = bb & -bb
+        atk |= pawn_atk[pawn_base | (lsb.bit_length() - 1)]
+        bb ^= lsb
+    bb = bbs[base + 1]
+    while bb:
+        lsb = bb & -bb
+        atk |= KNIGHT_ATTACKS[lsb.bit_length() - 1]
+        bb ^= lsb
+    bb = bbs[base + 2] | bbs[base + 4]
+    while bb:
+        lsb = bb & -bb
+        atk |= bishop_attacks(lsb.bit_length() - 1, occ)
+        bb ^= lsb
+    bb = bbs[base + 3] | bbs[base + 4]
+    while bb:
+        lsb = bb & -bb
+        atk |= rook_attacks(lsb.bit_length() - 1, occ)
+        bb ^= lsb
+    king_bb = bbs[base + 5]
+    if king_bb:
+        atk |= KING_ATTACKS[king_bb.bit_length() - 1]
+    return atk
 
 
 def _king_safety_mg(pos) -> int:
     # Penalize attacked ring squares around own king (midgame only)
-    w_king_sq = (pos.bitboards[5]).bit_length() - 1
-    b_king_sq = (pos.bitboards[11]).bit_length() - 1
-    w_ring = KING_ATTACKS[w_king_sq]
-    b_ring = KING_ATTACKS[b_king_sq]
-    w_pen = 0
-    b_pen = 0
-    for sq in _iter_bits(w_ring):
-        if is_square_attacked_by(BLACK, sq, pos):
-            w_pen += 1
-    for sq in _iter_bits(b_ring):
-        if is_square_attacked_by(WHITE, sq, pos):
-            b_pen += 1
+    w_king_bb = pos.bitboards[5]
+    b_king_bb = pos.bitboards[11]
+    if not w_king_bb or not b_king_bb:
+        # Illegal position reached in search; no meaningful safety term
+        return 0
+    w_ring = KING_ATTACKS[w_king_bb.bit_length() - 1]
+    b_ring = KING_ATTACKS[b_king_bb.bit_length() - 1]
+    w_pen = (_attacked_squares(pos, BLACK) & w_ring).bit_count()
+    b_pen = (_attacked_squares(pos, WHITE) & b_ring).bit_count()
     return -8 * (w_pen - b_pen)
 
 
 def game_phase_value(pos) -> int:
-    phase = 0
     # accumulate weights for both sides
-    for p in range(12):
-        bb = pos.bitboards[p]
-        base = p % 6
-        w = PHASE_WEIGHTS.get(base, 0)
-        while bb:
-            bb &= bb - 1
-            phase += w
+    phase = sum(PHASE_W[p] * pos.bitboards[p].bit_count() for p in range(12))
     if phase > MAX_PHASE:
         phase = MAX_PHASE
     return phase
 
 
-def evaluate(pos) -> int:
+# Fixed-size evaluation cache keyed on the position's Zobrist hash.
+# Always-replace, ~64k entries; the hash includes side to move, so the
+# stored score's perspective is unambiguous.
+_EVAL_TT_SIZE = 1 << 16
+_EVAL_TT_MASK = _EVAL_TT_SIZE - 1
+_EVAL_TT_KEYS = [0] * _EVAL_TT_SIZE
+_EVAL_TT_VALS = [0] * _EVAL_TT_SIZE
+
+# Lazy-eval margin: if the cheap material+PST blend already sits this far
+# outside the search window, mobility and king safety cannot flip the
+# alpha/beta decision, so they are skipped.
+LAZY_MARGIN = 300
+
+# Fixed-point reciprocal for the phase blend: (x * _INV24) >> 36 == x // 24
+# for 0 <= x < 2^33. _BLEND_BIAS (a multiple of 24) keeps the dividend
+# positive so the identity holds with floor semantics for negative blends.
+_INV24 = 2863311531  # ceil(2^36 / 24)
+_BLEND_BIAS = 24 << 21
+_BLEND_BIAS_Q = 1 << 21
+
+
+def evaluate(pos, alpha: int = None, beta: int = None) -> int:
+    key = pos.zobrist
+    idx = key & _EVAL_TT_MASK
+    if _EVAL_TT_KEYS[idx] == key:
+        return _EVAL_TT_VALS[idx]
     # Compute midgame and endgame components and blend
-    mat = _material_score(pos)
+    mat, phase = _material_and_phase(pos)
+    if phase > MAX_PHASE:
+        phase = MAX_PHASE
     pst_mg = _pst_score(pos, endgame=False)
     pst_eg = _pst_score(pos, endgame=True)
+    # Lazy gate: cheap blend of material+PST only, from STM perspective
+    if alpha is not None:
+        lazy = ((((mat + pst_mg) * phase + (mat + pst_eg) * (MAX_PHASE - phase)
+                  + _BLEND_BIAS) * _INV24) >> 36) - _BLEND_BIAS_Q
+        if pos.side_to_move != WHITE:
+            lazy = -lazy
+        if lazy - LAZY_MARGIN >= beta or lazy + LAZY_MARGIN <= alpha:
+            # Approximate score; deliberately not cached
+            return lazy
     mob = _mobility_score(pos)
     safety = _king_safety_mg(pos)
-    phase = game_phase_value(pos)  # 0..24
     mg = mat + pst_mg + mob + safety
     eg = mat + pst_eg + (mob // 2)  # lighter mobility in endgame
     # Blend: higher phase → favor MG
-    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    score = (((mg * phase + eg * (MAX_PHASE - phase) + _BLEND_BIAS) * _INV24) >> 36) - _BLEND_BIAS_Q
     # Return from side-to-move perspective
-    return score if pos.side_to_move == WHITE else -score
+    score = score if pos.side_to_move == WHITE else -score
+    _EVAL_TT_KEYS[idx] = key
+    _EVAL_TT_VALS[idx] = score
+    return score
 
 
 def eval_components(pos) -> Tuple[int, int, int]:
-    mat = _material_score(pos)
+    mat, phase = _material_and_phase(pos)
     pst_mg = _pst_score(pos, endgame=False)
     pst_eg = _pst_score(pos, endgame=True)
     mob = _mobility_score(pos)
     safety = _king_safety_mg(pos)
-    phase = game_phase_value(pos)
     mg = mat + pst_mg + mob + safety
     eg = mat + pst_eg + (mob // 2)
     return mg, eg, phase
 
 
+# Signed per-piece totals: SIGNED_VAL + signed PST, indexed [piece][sq].
+# Adding a piece is always `delta += table[piece][sq]`; removing subtracts.
+PIECE_SQ_MG = [[SIGNED_VAL[_p] + PST_MG[_p][_sq] for _sq in range(64)] for _p in range(12)]
+PIECE_SQ_EG = [[SIGNED_VAL[_p] + PST_EG[_p][_sq] for _sq in range(64)] for _p in range(12)]
+
+# Rook PST adjustment for castling, keyed by the king's destination square
+# (6/2 are white castles, 62/58 black; PST tables are already signed)
+CASTLE_ROOK_MG_DELTA = {
+    6: PST_MG[3][5] - PST_MG[3][7],    # O-O,   rook h1->f1
+    2: PST_MG[3][3] - PST_MG[3][0],    # O-O-O, rook a1->d1
+    62: PST_MG[9][61] - PST_MG[9][63],  # o-o,   rook h8->f8
+    58: PST_MG[9][59] - PST_MG[9][56],  # o-o-o, rook a8->d8
+}
+CASTLE_ROOK_EG_DELTA = {
+    6: PST_EG[3][5] - PST_EG[3][7],
+    2: PST_EG[3][3] - PST_EG[3][0],
+    62: PST_EG[9][61] - PST_EG[9][63],
+    58: PST_EG[9][59] - PST_EG[9][56],
+}
+
+# En passant: (capture-square offset from to_sq, captured pawn index) per mover side
+_EP_CAPTURE = ((-8, 6), (8, 0))
+
+
 def apply_move_eval_delta(pos, mv, mg: int, eg: int, phase: int) -> Tuple[int, int, int]:
     # Incremental update for material/PST/phase only (mobility/safety recomputed later)
-    side = pos.side_to_move
-    # helper for sign
-    def add_piece(piece_index: int, sq: int, end: bool) -> Tuple[int, int]:
-        v = PIECE_VALUES[piece_index % 6]
-        ps = pst(piece_index, sq, end)
-        if piece_index <= 5:
-            return v + ps, v + pst(piece_index, sq, True)
-        else:
-            return -v - ps, -v - pst(piece_index, sq, True)
-
-    def remove_piece(piece_index: int, sq: int) -> Tuple[int, int]:
-        v = PIECE_VALUES[piece_index % 6]
-        ps_mg = pst(piece_index, sq, False)
-        ps_eg = pst(piece_index, sq, True)
-        if piece_index <= 5:
-            return -(v + ps_mg), -(v + ps_eg)
-        else:
-            return (v + ps_mg), (v + ps_eg)
+    # Bind Move attributes once; this runs on every make_move in search
+    piece = mv.piece
+    from_sq = mv.from_sq
+    to_sq = mv.to_sq
+    promo = mv.promotion
+    cap = mv.capture_piece
+    dst_piece = promo if promo is not None else piece
 
-    mg_delta = 0
-    eg_delta = 0
+    # Move piece from -> to (tables are signed, so no per-color branches)
+    mg_delta = PIECE_SQ_MG[dst_piece][to_sq] - PIECE_SQ_MG[piece][from_sq]
+    eg_delta = PIECE_SQ_EG[dst_piece][to_sq] - PIECE_SQ_EG[piece][from_sq]
     phase_delta = 0
 
-    # Move piece from -> to
-    mg_r, eg_r = remove_piece(mv.piece, mv.from_sq)
-    mg_delta += mg_r
-    eg_delta += eg_r
-    dst_piece = mv.promotion if mv.promotion is not None else mv.piece
-    mg_a, eg_a = add_piece(dst_piece, mv.to_sq, False)
-    mg_delta += mg_a
-    eg_delta += eg_a
-
-    # Capture
+    # Capture (removal decreases phase)
     if mv.is_en_passant:
-        if side == WHITE:
-            cap_sq = mv.to_sq - 8
-            mg_c, eg_c = remove_piece(6, cap_sq)
-        else:
-            cap_sq = mv.to_sq + 8
-            mg_c, eg_c = remove_piece(0, cap_sq)
-        mg_delta += mg_c
-        eg_delta += eg_c
-        phase_delta += PHASE_WEIGHTS.get(0, 0)
-    elif mv.capture_piece is not None:
-        mg_c, eg_c = remove_piece(mv.capture_piece, mv.to_sq)
-        mg_delta += mg_c
-        eg_delta += eg_c
-        phase_delta += PHASE_WEIGHTS.get(mv.capture_piece % 6, 0)
+        off, cap = _EP_CAPTURE[pos.side_to_move]
+        cap_sq = to_sq + off
+        mg_delta -= PIECE_SQ_MG[cap][cap_sq]
+        eg_delta -= PIECE_SQ_EG[cap][cap_sq]
+    elif cap is not None:
+        mg_delta -= PIECE_SQ_MG[cap][to_sq]
+        eg_delta -= PIECE_SQ_EG[cap][to_sq]
+        phase_delta -= PHASE_W[cap]
 
     # Castling rook move PST adjust
     if mv.is_castling:
-        if side == WHITE:
-            if mv.to_sq == 6:  # e1->g1, rook h1->f1
-                r_from, r_to = 7, 5
-                mg_delta += pst(3, r_to, False) - pst(3, r_from, False)
-                eg_delta += pst(3, r_to, True) - pst(3, r_from, True)
-            else:  # e1->c1, rook a1->d1
-                r_from, r_to = 0, 3
-                mg_delta += pst(3, r_to, False) - pst(3, r_from, False)
-                eg_delta += pst(3, r_to, True) - pst(3, r_from, True)
-        else:
-            if mv.to_sq == 62:  # e8->g8, rook h8->f8
-                r_from, r_to = 63, 61
-                mg_delta += -pst(9, r_to, False) + pst(9, r_from, False)
-                eg_delta += -pst(9, r_to, True) + pst(9, r_from, True)
-            else:  # e8->c8, rook a8->d8
-                r_from, r_to = 56, 59
-                mg_delta += -pst(9, r_to, False) + pst(9, r_from, False)
-                eg_delta += -pst(9, r_to, True) + pst(9, r_from, True)
-
-    # Promotion phase change
-    if mv.promotion is not None:
-        # remove pawn, add promoted piece already handled in mg/eg
-        phase_delta += PHASE_WEIGHTS.get(mv.promotion % 6, 0) - PHASE_WEIGHTS.get(0, 0)
-
-    new_mg = mg + mg_delta
-    new_eg = eg + eg_delta
-    new_phase = max(0, min(MAX_PHASE, phase + phase_delta))
-    return new_mg, new_eg, new_phase
+        mg_delta += CASTLE_ROOK_MG_DELTA[to_sq]
+        eg_delta += CASTLE_ROOK_EG_DELTA[to_sq]
+
+    # Promotion phase change (pawn weight is 0, so just add the new piece's)
+    if promo is not None:
+        phase_delta += PHASE_W[promo]
+
+    return mg + mg_delta, eg + eg_delta, phase + phase_delta
 
 from typing import Optional, Tuple
 from attacks import PAWN_ATTACKS, KNIGHT_ATTACKS, KING_ATTACKS, rook_attacks, bishop_attacks, queen_attacks
@@ -296,7 +374,7 @@ def _get_smallest_attacker(pos, sq: int, side: int, occ: int) -> Optional[tuple[
     # 1. Tốt (Pawns)
     pawn_idx = start
     # Lấy các đòn tấn công của Tốt (của bên đối thủ) *vào* ô sq
-    attacks_to_sq = PAWN_ATTACKS[1 - side][sq] 
+    attacks_to_sq = PAWN_ATTACKS[((1 - side) << 6) | sq]
     attackers = attacks_to_sq & pos.bitboards[pawn_idx] & occ
     if attackers:
         # Trả về Tốt đầu tiên tìm thấy
@@ -340,13 +418,17 @@ def _get_smallest_attacker(pos, sq: int, side: int, occ: int) -> Optional[tuple[
 
     return None
 
+# Bộ đệm gain dùng chung cho see() để tránh cấp phát list mỗi lần gọi
+_SEE_GAIN = [0] * 32
+
+
 def see(pos, mv) -> int:
     """
     Thực hiện Đánh giá Trao đổi Tĩnh (Static Exchange Evaluation) cho một nước đi.
     Trả về điểm số (dương là lời, âm là lỗ).
     """
-    gain = [0] * 32  # Một stack để lưu giá trị vật chất
-    d = 0            # Độ sâu của chuỗi trao đổi
+    gain = _SEE_GAIN  # Stack dùng lại giữa các lần gọi (mỗi slot được ghi trước khi đọc)
+    d = 0             # Độ sâu của chuỗi trao đổi
     
     from_sq = mv.from_sq
     to_sq = mv.to_sq
@@ -364,38 +446,75 @@ def see(pos, mv) -> int:
         
     # Quân cờ di chuyển ban đầu
     attacker_piece_idx = mv.piece
-    
+
+    # Early-out: bắt quân giá trị cao bằng quân giá trị thấp luôn lời ít nhất
+    # (giá trị bị bắt - giá trị quân bắt), khỏi cần mô phỏng chuỗi trao đổi.
+    cap_val = PV12[captured_piece_idx]
+    att_val = PV12[attacker_piece_idx]
+    if att_val < cap_val:
+        return cap_val - att_val
+
     # Bàn cờ (occupancy) để mô phỏng, bắt đầu bằng cách xóa quân tấn công
     occ = pos.all_occupancy ^ (1 << from_sq)
-    
+
     # Giá trị của quân bị bắt đầu tiên
-    gain[d] = PIECE_VALUES[captured_piece_idx % 6]
-    
+    gain[d] = PV12[captured_piece_idx]
+
+    # Hoist mọi lookup ra local cho vòng lặp nóng
+    bbs = pos.bitboards
+    pawn_atk = PAWN_ATTACKS
+    knight_atk = KNIGHT_ATTACKS
+    king_atk = KING_ATTACKS
+    b_atk = bishop_attacks
+    r_atk = rook_attacks
+
     while True:
         d += 1
         side = 1 - side # Đổi lượt
 
-        # Tìm quân tấn công tiếp theo (giá trị nhỏ nhất)
-        attacker_data = _get_smallest_attacker(pos, to_sq, side, occ)
-        
-        if attacker_data is None:
-            break # Không còn ai bắt lại
+        # Tìm quân tấn công tiếp theo (giá trị nhỏ nhất) - inline, không gọi hàm
+        start = 0 if side == WHITE else 6
+        attackers = pawn_atk[((1 - side) << 6) | to_sq] & bbs[start] & occ
+        if attackers:
+            next_piece = start
+        else:
+            attackers = knight_atk[to_sq] & bbs[start + 1] & occ
+            if attackers:
+                next_piece = start + 1
+            else:
+                diag = b_atk(to_sq, occ)
+                attackers = diag & bbs[start + 2] & occ
+                if attackers:
+                    next_piece = start + 2
+                else:
+                    ortho = r_atk(to_sq, occ)
+                    attackers = ortho & bbs[start + 3] & occ
+                    if attackers:
+                        next_piece = start + 3
+                    else:
+                        attackers = (diag | ortho) & bbs[start + 4] & occ
+                        if attackers:
+                            next_piece = start + 4
+                        else:
+                            attackers = king_atk[to_sq] & bbs[start + 5] & occ
+                            if attackers:
+                                next_piece = start + 5
+                            else:
+                                break # Không còn ai bắt lại
 
-        next_attacker_piece_idx, next_from_sq = attacker_data
-        
         # "Loại bỏ" quân tấn công khỏi bàn cờ mô phỏng
-        occ ^= (1 << next_from_sq)
-        
+        occ ^= attackers & -attackers
+
         # Cập nhật gain
         # gain[d] = (giá trị quân vừa bắt của lượt trước) - (gain của lượt trước)
-        gain[d] = PIECE_VALUES[attacker_piece_idx % 6] - gain[d-1]
-        
-        # Tối ưu hóa: nếu nước đi này lỗ và nước trước cũng lỗ,
-        # bên này sẽ chọn không bắt tiếp
-        if gain[d] < 0 and gain[d-1] < 0:
+        gain[d] = PV12[attacker_piece_idx] - gain[d-1]
+
+        # Tối ưu hóa (stand pat): nếu cả hai phía đều không thể cải thiện,
+        # dừng chuỗi trao đổi ngay
+        if max(-gain[d-1], gain[d]) < 0:
             break
-            
-        attacker_piece_idx = next_attacker_piece_idx
+
+        attacker_piece_idx = next_piece
 
     # "Unroll" stack để tìm kết quả cuối cùng
     # (Bên nào không bắt sẽ có max(0, -gain[d]))
@@ -1,87 +1,76 @@
-from dataclasses import dataclass
 from typing import List, Optional, TYPE_CHECKING
 
-from constants import WHITE, BLACK, CR_WK, CR_WQ, CR_BK, CR_BQ
-from attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rook_attacks, bishop_attacks, queen_attacks
+from constants import WHITE, BLACK, CR_WK, CR_WQ, CR_BK, CR_BQ, CR_MASK
+from attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_ATTACKERS, BETWEEN, rook_attacks, bishop_attacks, queen_attacks
 
 if TYPE_CHECKING:
     from .position import Position
 
 
-@dataclass(frozen=True)
 class Move:
-    from_sq: int
-    to_sq: int
-    piece: int
-    capture_piece: Optional[int] = None
-    promotion: Optional[int] = None
-    is_en_passant: bool = False
-    is_castling: bool = False
-    is_double_push: bool = False
+    # Plain __slots__ class: noticeably cheaper to construct than the old
+    # frozen dataclass, and movegen creates tens of these per node.
+    # Identity hash/eq is intentional — consumers compare by attributes.
+    __slots__ = ('from_sq', 'to_sq', 'piece', 'capture_piece', 'promotion',
+                 'is_en_passant', 'is_castling', 'is_double_push', '_key',
+                 'quiet')
+
+    def __init__(self, from_sq: int, to_sq: int, piece: int,
+                 capture_piece: Optional[int] = None,
+                 promotion: Optional[int] = None,
+                 is_en_passant: bool = False,
+                 is_castling: bool = False,
+                 is_double_push: bool = False):
+        self.from_sq = from_sq
+        self.to_sq = to_sq
+        self.piece = piece
+        self.capture_piece = capture_piece
+        self.promotion = promotion
+        self.is_en_passant = is_en_passant
+        self.is_castling = is_castling
+        self.is_double_push = is_double_push
+        # Packed identity for killer/TT/history comparisons: one int
+        # equality instead of three attribute compares (promo index is
+        # never 0, so 0 safely means "no promotion")
+        self._key = (from_sq << 12) | (to_sq << 6) | (promotion or 0)
+        # Precomputed for the search's LMR/futility/killer tests
+        self.quiet = capture_piece is None and promotion is None and not is_en_passant
+
+    def __repr__(self) -> str:
+        return (f"Move(from_sq={self.from_sq}, to_sq={self.to_sq}, "
+                f"piece={self.piece}, capture_piece={self.capture_piece}, "
+                f"promotion={self.promotion})")
 
 def _iter_bits(bb: int):
+    # LS1B extraction with the method hoisted to a local and an XOR clear
+    # (lsb is already in hand, so ^= beats the bb & (bb-1) recompute)
+    bl = int.bit_length
     while bb:
         lsb = bb & -bb
-        sq = lsb.bit_length() - 1
-        yield sq
-        bb &= bb - 1
+        yield bl(lsb) - 1
+        bb ^= lsb
 
 
 def _piece_at(pos: 'Position', sq: int) -> Optional[int]:
     return pos.piece_at(sq)
 
 
+# Piece indices (pawn, knight, king, bishop, queen, rook) per attacking side
+_ATK_IDX = ((0, 1, 5, 2, 4, 3), (6, 7, 11, 8, 10, 9))
+
+
 def is_square_attacked_by(side: int, sq: int, pos: 'Position') -> bool:
     occ = pos.all_occupancy
-    # Pawns
-    if side == WHITE:
-        # White pawns attack upward, so sources are down-left/down-right from sq
-        r = sq // 8
-        f = sq % 8
-        if r > 0:
-            if f > 0 and ((pos.bitboards[0] >> (sq - 9)) & 1):
-                return True
-            if f < 7 and ((pos.bitboards[0] >> (sq - 7)) & 1):
-                return True
-    else:
-        r = sq // 8
-        f = sq % 8
-        if r < 7:
-            if f > 0 and ((pos.bitboards[6] >> (sq + 7)) & 1):
-                return True
-            if f < 7 and ((pos.bitboards[6] >> (sq + 9)) & 1):
-                return True
-    # Knights
-    if side == WHITE:
-        if KNIGHT_ATTACKS[sq] & pos.bitboards[1]:
-            return True
-    else:
-        if KNIGHT_ATTACKS[sq] & pos.bitboards[7]:
-            return True
-    # King
-    if side == WHITE:
-        if KING_ATTACKS[sq] & pos.bitboards[5]:
-            return True
-    else:
-        if KING_ATTACKS[sq] & pos.bitboards[11]:
-            return True
-    # Diagonals (bishops/queens)
-    diag = bishop_attacks(sq, occ)
-    if side == WHITE:
-        if diag & (pos.bitboards[2] | pos.bitboards[4]):
-            return True
-    else:
-        if diag & (pos.bitboards[8] | pos.bitboards[10]):
-            return True
-    # Orthogonals (rooks/queens)
-    ortho = rook_attacks(sq, occ)
-    if side == WHITE:
-        if ortho & (pos.bitboards[3] | pos.bitboards[4]):
-            return True
-    else:
-        if ortho & (pos.bitboards[9] | pos.bitboards[10]):
-            return True
-    return False
+    bbs = pos.bitboards
+    p, n, k, b, q, r = _ATK_IDX[side]
+    # Cheap leapers first; `or` keeps the early-out behaviour
+    return bool(
+        (PAWN_ATTACKERS[(side << 6) | sq] & bbs[p])
+        or (KNIGHT_ATTACKS[sq] & bbs[n])
+        or (KING_ATTACKS[sq] & bbs[k])
+        or (bishop_attacks(sq, occ) & (bbs[b] | bbs[q]))
+        or (rook_attacks(sq, occ) & (bbs[r] | bbs[q]))
+    )
 
 
 def _own_occ(pos: 'Position') -> int:
@@ -97,121 +86,208 @@ PROMOTION_MAP = {
     BLACK: [10, 9, 8, 7],  # q, r, b, n
 }
 
-
-def generate_pseudo_legal_moves(pos: 'Position') -> List[Move]:
-    moves: List[Move] = []
+# Piece indices per side, unpacked once per movegen call
+_WHITE_PIECES = (0, 1, 2, 3, 4, 5)
+_BLACK_PIECES = (6, 7, 8, 9, 10, 11)
+
+# Masks for setwise pawn generation
+_MASK64 = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = 0x8080808080808080
+RANK_1 = 0x00000000000000FF
+RANK_3 = 0x0000000000FF0000
+RANK_6 = 0x0000FF0000000000
+RANK_8 = 0xFF00000000000000
+
+# Generation stages: everything, noisy only (captures/EP/promotions),
+# or quiet only (non-capturing, non-promoting, incl. castling)
+GEN_ALL, GEN_NOISY, GEN_QUIET = 0, 1, 2
+
+
+def generate_pseudo_legal_moves(pos: 'Position', out: Optional[List[Move]] = None, mode: int = GEN_ALL) -> List[Move]:
+    # Callers may pass a reusable buffer to avoid per-node list churn;
+    # it is cleared here before filling
+    if out is None:
+        moves: List[Move] = []
+    else:
+        moves = out
+        del moves[:]
+    noisy = mode != GEN_QUIET
+    quiet = mode != GEN_NOISY
     side = pos.side_to_move
+    bbs = pos.bitboards
+    mailbox = pos.mailbox
+    _, knight_idx, bishop_idx, rook_idx, queen_idx, king_idx = (
+        _WHITE_PIECES if side == WHITE else _BLACK_PIECES)
     own = _own_occ(pos)
     opp = _opp_occ(pos)
     occ = pos.all_occupancy
 
-    # Pawns
+    # Pawns: setwise generation — push/capture destination sets are built
+    # with whole-board shifts, then only the destination bits are walked
     if side == WHITE:
-        pawns = pos.bitboards[0]
-        for sq in _iter_bits(pawns):
-            r = sq // 8
-            # Push
-            to1 = sq + 8
-            if to1 < 64 and not ((occ >> to1) & 1):
-                if r == 6:  # promotion rank (moving to rank 8)
+        pawns = bbs[0]
+        single = ((pawns << 8) & _MASK64) & ~occ
+        if quiet:
+            bb = single & ~RANK_8
+            while bb:
+                lsb = bb & -bb
+                to = lsb.bit_length() - 1
+                bb ^= lsb
+                moves.append(Move(to - 8, to, 0))
+            double = ((single & RANK_3) << 8) & ~occ
+            while double:
+                lsb = double & -double
+                to = lsb.bit_length() - 1
+                double ^= lsb
+                moves.append(Move(to - 16, to, 0, is_double_push=True))
+        if noisy:
+            bb = single & RANK_8
+            while bb:
+                lsb = bb & -bb
+                to = lsb.bit_length() - 1
+                bb ^= lsb
+                for promo in PROMOTION_MAP[WHITE]:
+                    moves.append(Move(to - 8, to, 0, promotion=promo))
+            cap_w = (((pawns & ~FILE_A) << 7) & _MASK64) & opp
+            cap_e = (((pawns & ~FILE_H) << 9) & _MASK64) & opp
+            for caps, off in ((cap_w, 7), (cap_e, 9)):
+                bb = caps & ~RANK_8
+                while bb:
+                    lsb = bb & -bb
+                    to = lsb.bit_length() - 1
+                    bb ^= lsb
+                    moves.append(Move(to - off, to, 0, capture_piece=mailbox[to]))
+                bb = caps & RANK_8
+                while bb:
+                    lsb = bb & -bb
+                    to = lsb.bit_length() - 1
+                    bb ^= lsb
                     for promo in PROMOTION_MAP[WHITE]:
-                        moves.append(Move(sq, to1, 0, promotion=promo))
-                else:
-                    moves.append(Move(sq, to1, 0))
-                    # Double push
-                    if r == 1:
-                        to2 = sq + 16
-                        if not ((occ >> to2) & 1):
-                            moves.append(Move(sq, to2, 0, is_double_push=True))
-            # Captures
-            for dest in [sq + 7, sq + 9]:
-                if 0 <= dest < 64:
-                    df = abs((dest % 8) - (sq % 8))
-                    if df == 1 and ((opp >> dest) & 1):
-                        cap = _piece_at(pos, dest)
-                        if r == 6:
-                            for promo in PROMOTION_MAP[WHITE]:
-                                moves.append(Move(sq, dest, 0, capture_piece=cap, promotion=promo))
-                        else:
-                            moves.append(Move(sq, dest, 0, capture_piece=cap))
-            # En passant
-            if pos.ep_square is not None:
-                if pos.ep_square in [sq + 7, sq + 9] and abs((pos.ep_square % 8) - (sq % 8)) == 1:
-                    moves.append(Move(sq, pos.ep_square, 0, capture_piece=6, is_en_passant=True))
+                        moves.append(Move(to - off, to, 0, capture_piece=mailbox[to], promotion=promo))
+            # En passant: sources straight from the attacker table
+            ep = pos.ep_square
+            if ep is not None:
+                srcs = PAWN_ATTACKERS[ep] & pawns
+                while srcs:
+                    lsb = srcs & -srcs
+                    moves.append(Move(lsb.bit_length() - 1, ep, 0, capture_piece=6, is_en_passant=True))
+                    srcs ^= lsb
     else:
-        pawns = pos.bitboards[6]
-        for sq in _iter_bits(pawns):
-            r = sq // 8
-            # Push
-            to1 = sq - 8
-            if to1 >= 0 and not ((occ >> to1) & 1):
-                if r == 1:  # promotion rank (moving to rank 1)
+        pawns = bbs[6]
+        single = (pawns >> 8) & ~occ
+        if quiet:
+            bb = single & ~RANK_1
+            while bb:
+                lsb = bb & -bb
+                to = lsb.bit_length() - 1
+                bb ^= lsb
+                moves.append(Move(to + 8, to, 6))
+            double = ((single & RANK_6) >> 8) & ~occ
+            while double:
+                lsb = double & -double
+                to = lsb.bit_length() - 1
+                double ^= lsb
+                moves.append(Move(to + 16, to, 6, is_double_push=True))
+        if noisy:
+            bb = single & RANK_1
+            while bb:
+                lsb = bb & -bb
+                to = lsb.bit_length() - 1
+                bb ^= lsb
+                for promo in PROMOTION_MAP[BLACK]:
+                    moves.append(Move(to + 8, to, 6, promotion=promo))
+            cap_e = ((pawns & ~FILE_H) >> 7) & opp
+            cap_w = ((pawns & ~FILE_A) >> 9) & opp
+            for caps, off in ((cap_e, 7), (cap_w, 9)):
+                bb = caps & ~RANK_1
+                while bb:
+                    lsb = bb & -bb
+                    to = lsb.bit_length() - 1
+                    bb ^= lsb
+                    moves.append(Move(to + off, to, 6, capture_piece=mailbox[to]))
+                bb = caps & RANK_1
+                while bb:
+                    lsb = bb & -bb
+                    to = lsb.bit_length() - 1
+                    bb ^= lsb
                     for promo in PROMOTION_MAP[BLACK]:
-                        moves.append(Move(sq, to1, 6, promotion=promo))
-                else:
-                    moves.append(Move(sq, to1, 6))
-                    # Double push
-                    if r == 6:
-                        to2 = sq - 16
-                        if to2 >= 0 and not ((occ >> to2) & 1):
-                            moves.append(Move(sq, to2, 6, is_double_push=True))
-            # Captures
-            for dest in [sq - 7, sq - 9]:
-                if 0 <= dest < 64:
-                    df = abs((dest % 8) - (sq % 8))
-                    if df == 1 and ((opp >> dest) & 1):
-                        cap = _piece_at(pos, dest)
-                        if r == 1:
-                            for promo in PROMOTION_MAP[BLACK]:
-                                moves.append(Move(sq, dest, 6, capture_piece=cap, promotion=promo))
-                        else:
-                            moves.append(Move(sq, dest, 6, capture_piece=cap))
-            # En passant
-            if pos.ep_square is not None:
-                if pos.ep_square in [sq - 7, sq - 9] and abs((pos.ep_square % 8) - (sq % 8)) == 1:
-                    moves.append(Move(sq, pos.ep_square, 6, capture_piece=0, is_en_passant=True))
+                        moves.append(Move(to + off, to, 6, capture_piece=mailbox[to], promotion=promo))
+            # En passant: sources straight from the attacker table
+            ep = pos.ep_square
+            if ep is not None:
+                srcs = PAWN_ATTACKERS[64 | ep] & pawns
+                while srcs:
+                    lsb = srcs & -srcs
+                    moves.append(Move(lsb.bit_length() - 1, ep, 6, capture_piece=0, is_en_passant=True))
+                    srcs ^= lsb
 
     # Knights
-    knights = pos.bitboards[1 if side == WHITE else 7]
-    for sq in _iter_bits(knights):
-        dests = KNIGHT_ATTACKS[sq] & ~own
-        for dest in _iter_bits(dests):
-            cap = _piece_at(pos, dest) if ((opp >> dest) & 1) else None
-            moves.append(Move(sq, dest, 1 if side == WHITE else 7, capture_piece=cap))
-
-    # Bishops
-    bishops = pos.bitboards[2 if side == WHITE else 8]
-    for sq in _iter_bits(bishops):
-        dests = bishop_attacks(sq, occ) & ~own
-        for dest in _iter_bits(dests):
-            cap = _piece_at(pos, dest) if ((opp >> dest) & 1) else None
-            moves.append(Move(sq, dest, 2 if side == WHITE else 8, capture_piece=cap))
-
-    # Rooks
-    rooks = pos.bitboards[3 if side == WHITE else 9]
-    for sq in _iter_bits(rooks):
-        dests = rook_attacks(sq, occ) & ~own
-        for dest in _iter_bits(dests):
-            cap = _piece_at(pos, dest) if ((opp >> dest) & 1) else None
-            moves.append(Move(sq, dest, 3 if side == WHITE else 9, capture_piece=cap))
-
-    # Queens
-    queens = pos.bitboards[4 if side == WHITE else 10]
-    for sq in _iter_bits(queens):
-        dests = queen_attacks(sq, occ) & ~own
-        for dest in _iter_bits(dests):
-            cap = _piece_at(pos, dest) if ((opp >> dest) & 1) else None
-            moves.append(Move(sq, dest, 4 if side == WHITE else 10, capture_piece=cap))
+    bb = bbs[knight_idx]
+    while bb:
+        lsb = bb & -bb
+        sq = lsb.bit_length() - 1
+        bb ^= lsb
+        atk = KNIGHT_ATTACKS[sq]
+        if noisy:
+            dests = atk & opp
+            while dests:
+                dlsb = dests & -dests
+                dest = dlsb.bit_length() - 1
+                dests ^= dlsb
+                moves.append(Move(sq, dest, knight_idx, capture_piece=mailbox[dest]))
+        if quiet:
+            dests = atk & ~occ
+            while dests:
+                dlsb = dests & -dests
+                dest = dlsb.bit_length() - 1
+                dests ^= dlsb
+                moves.append(Move(sq, dest, knight_idx))
+
+    # Sliders: captures and quiets walked separately (like knights), so
+    # the capture loop reads the mailbox unconditionally
+    for piece_idx, attacks in ((bishop_idx, bishop_attacks), (rook_idx, rook_attacks), (queen_idx, queen_attacks)):
+        bb = bbs[piece_idx]
+        while bb:
+            lsb = bb & -bb
+            sq = lsb.bit_length() - 1
+            bb ^= lsb
+            atk = attacks(sq, occ)
+            if noisy:
+                dests = atk & opp
+                while dests:
+                    dlsb = dests & -dests
+                    dest = dlsb.bit_length() - 1
+                    dests ^= dlsb
+                    moves.append(Move(sq, dest, piece_idx, capture_piece=mailbox[dest]))
+            if quiet:
+                dests = atk & ~occ
+                while dests:
+                    dlsb = dests & -dests
+                    dest = dlsb.bit_length() - 1
+                    dests ^= dlsb
+                    moves.append(Move(sq, dest, piece_idx))
 
     # King (non-castling)
-    king_sq = (pos.bitboards[5 if side == WHITE else 11]).bit_length() - 1
-    dests = KING_ATTACKS[king_sq] & ~own
-    for dest in _iter_bits(dests):
-        cap = _piece_at(pos, dest) if ((opp >> dest) & 1) else None
-        moves.append(Move(king_sq, dest, 5 if side == WHITE else 11, capture_piece=cap))
-
-    # Castling generation
-    moves.extend(_generate_castling(pos))
+    king_sq = (bbs[king_idx]).bit_length() - 1
+    atk = KING_ATTACKS[king_sq]
+    if noisy:
+        dests = atk & opp
+        while dests:
+            dlsb = dests & -dests
+            dest = dlsb.bit_length() - 1
+            dests ^= dlsb
+            moves.append(Move(king_sq, dest, king_idx, capture_piece=mailbox[dest]))
+    if quiet:
+        dests = atk & ~occ
+        while dests:
+            dlsb = dests & -dests
+            dest = dlsb.bit_length() - 1
+            dests ^= dlsb
+            moves.append(Move(king_sq, dest, king_idx))
+
+        # Castling generation
+        moves.extend(_generate_castling(pos))
 
     return moves
 
@@ -219,19 +295,20 @@ def generate_pseudo_legal_moves(pos: 'Position') -> List[Move]:
 def _generate_castling(pos: 'Position') -> List[Move]:
     side = pos.side_to_move
     occ = pos.all_occupancy
+    bbs = pos.bitboards
     moves: List[Move] = []
     if side == WHITE:
         e1, f1, g1, d1, c1, b1, a1, h1 = 4, 5, 6, 3, 2, 1, 0, 7
         # King side
         if pos.castling_rights & CR_WK:
             path_empty = not ((occ >> f1) & 1) and not ((occ >> g1) & 1)
-            rook_on_h1 = ((pos.bitboards[3] >> h1) & 1) == 1
+            rook_on_h1 = ((bbs[3] >> h1) & 1) == 1
             if path_empty and rook_on_h1 and not is_square_attacked_by(BLACK, e1, pos) and not is_square_attacked_by(BLACK, f1, pos) and not is_square_attacked_by(BLACK, g1, pos):
                 moves.append(Move(e1, g1, 5, is_castling=True))
         # Queen side
         if pos.castling_rights & CR_WQ:
             path_empty = not ((occ >> d1) & 1) and not ((occ >> c1) & 1) and not ((occ >> b1) & 1)
-            rook_on_a1 = ((pos.bitboards[3] >> a1) & 1) == 1
+            rook_on_a1 = ((bbs[3] >> a1) & 1) == 1
             if path_empty and rook_on_a1 and not is_square_attacked_by(BLACK, e1, pos) and not is_square_attacked_by(BLACK, d1, pos) and not is_square_attacked_by(BLACK, c1, pos):
                 moves.append(Move(e1, c1, 5, is_castling=True))
     else:
@@ -239,13 +316,13 @@ def _generate_castling(pos: 'Position') -> List[Move]:
         # King side
         if pos.castling_rights & CR_BK:
             path_empty = not ((occ >> f8) & 1) and not ((occ >> g8) & 1)
-            rook_on_h8 = ((pos.bitboards[9] >> h8) & 1) == 1
+            rook_on_h8 = ((bbs[9] >> h8) & 1) == 1
             if path_empty and rook_on_h8 and not is_square_attacked_by(WHITE, e8, pos) and not is_square_attacked_by(WHITE, f8, pos) and not is_square_attacked_by(WHITE, g8, pos):
                 moves.append(Move(e8, g8, 11, is_castling=True))
         # Queen side
         if pos.castling_rights & CR_BQ:
             path_empty = not ((occ >> d8) & 1) and not ((occ >> c8) & 1) and not ((occ >> b8) & 1)
-            rook_on_a8 = ((pos.bitboards[9] >> a8) & 1) == 1
+            rook_on_a8 = ((bbs[9] >> a8) & 1) == 1
             if path_empty and rook_on_a8 and not is_square_attacked_by(WHITE, e8, pos) and not is_square_attacked_by(WHITE, d8, pos) and not is_square_attacked_by(WHITE, c8, pos):
                 moves.append(Move(e8, c8, 11, is_castling=True))
     return moves
@@ -254,75 +331,87 @@ def _generate_castling(pos: 'Position') -> List[Move]:
 def apply_move_clone(pos: 'Position', mv: Move) -> 'Position':
     new = pos.clone()
     side = pos.side_to_move
+    bbs = new.bitboards
+    mailbox = new.mailbox
+    table = new.zobrist_table
+    ps = table.piece_square
+    ef = table.ep_file_keys
+    # Incremental Zobrist, same XOR scheme as Position.make_move
+    h = new.zobrist
     # Clear EP by default; set only when double push is made
+    if pos.ep_square is not None:
+        h ^= ef[pos.ep_square % 8]
     new.ep_square = None
 
     from_bit = 1 << mv.from_sq
     to_bit = 1 << mv.to_sq
 
     # Remove moving piece
-    new.bitboards[mv.piece] &= ~from_bit
-
-    # Handle captures
+    h ^= ps[mv.piece][mv.from_sq]
+    bbs[mv.piece] &= ~from_bit
+    mailbox[mv.from_sq] = 255
+    own_delta = from_bit ^ to_bit
+    cap_bit = 0
+
+    # Unified capture path (see Position.make_move): resolve the captured
+    # square/piece up front so one branch handles EP and normal captures
     if mv.is_en_passant:
-        if side == WHITE:
-            cap_sq = mv.to_sq - 8
-            new.bitboards[6] &= ~(1 << cap_sq)
-        else:
-            cap_sq = mv.to_sq + 8
-            new.bitboards[0] &= ~(1 << cap_sq)
-    elif mv.capture_piece is not None:
-        new.bitboards[mv.capture_piece] &= ~to_bit
+        cap_sq = mv.to_sq - 8 if side == WHITE else mv.to_sq + 8
+        cap_piece = 6 if side == WHITE else 0
+    else:
+        cap_sq = mv.to_sq
+        cap_piece = mv.capture_piece
+    if cap_piece is not None:
+        cap_bit = 1 << cap_sq
+        bbs[cap_piece] &= ~cap_bit
+        h ^= ps[cap_piece][cap_sq]
+        mailbox[cap_sq] = 255
 
     # Place moving or promoted piece
     dst_piece = mv.promotion if mv.promotion is not None else mv.piece
-    new.bitboards[dst_piece] |= to_bit
+    bbs[dst_piece] |= to_bit
+    h ^= ps[dst_piece][mv.to_sq]
+    mailbox[mv.to_sq] = dst_piece
 
     # Castling: move rook
     if mv.is_castling:
         if side == WHITE:
             if mv.to_sq == 6:  # e1->g1
                 # rook h1->f1
-                new.bitboards[3] &= ~(1 << 7)
-                new.bitboards[3] |= (1 << 5)
+                bbs[3] &= ~(1 << 7)
+                bbs[3] |= (1 << 5)
+                h ^= ps[3][7] ^ ps[3][5]
+                mailbox[7] = 255
+                mailbox[5] = 3
+                own_delta ^= 0xA0  # bits 5 and 7
             else:  # e1->c1
-                new.bitboards[3] &= ~(1 << 0)
-                new.bitboards[3] |= (1 << 3)
+                bbs[3] &= ~(1 << 0)
+                bbs[3] |= (1 << 3)
+                h ^= ps[3][0] ^ ps[3][3]
+                mailbox[0] = 255
+                mailbox[3] = 3
+                own_delta ^= 0x09  # bits 0 and 3
         else:
             if mv.to_sq == 62:  # e8->g8
-                new.bitboards[9] &= ~(1 << 63)
-                new.bitboards[9] |= (1 << 61)
+                bbs[9] &= ~(1 << 63)
+                bbs[9] |= (1 << 61)
+                h ^= ps[9][63] ^ ps[9][61]
+                mailbox[63] = 255
+                mailbox[61] = 9
+                own_delta ^= (1 << 63) | (1 << 61)
             else:  # e8->c8
-                new.bitboards[9] &= ~(1 << 56)
-                new.bitboards[9] |= (1 << 59)
-
-    # Update castling rights (basic): moving king or rook loses rights; rook captures handled by occupancy recompute
-    if side == WHITE:
-        if mv.piece == 5:
-            new.castling_rights &= ~(CR_WK | CR_WQ)
-        elif mv.piece == 3:
-            if mv.from_sq == 0:
-                new.castling_rights &= ~CR_WQ
-            elif mv.from_sq == 7:
-                new.castling_rights &= ~CR_WK
-        if mv.capture_piece == 9:  # captured black rook on a8/h8
-            if mv.to_sq == 56:
-                new.castling_rights &= ~CR_BQ
-            elif mv.to_sq == 63:
-                new.castling_rights &= ~CR_BK
-    else:
-        if mv.piece == 11:
-            new.castling_rights &= ~(CR_BK | CR_BQ)
-        elif mv.piece == 9:
-            if mv.from_sq == 56:
-                new.castling_rights &= ~CR_BQ
-            elif mv.from_sq == 63:
-                new.castling_rights &= ~CR_BK
-        if mv.capture_piece == 3:
-            if mv.to_sq == 0:
-                new.castling_rights &= ~CR_WQ
-            elif mv.to_sq == 7:
-                new.castling_rights &= ~CR_WK
+                bbs[9] &= ~(1 << 56)
+                bbs[9] |= (1 << 59)
+                h ^= ps[9][56] ^ ps[9][59]
+                mailbox[56] = 255
+                mailbox[59] = 9
+                own_delta ^= (1 << 56) | (1 << 59)
+
+    # Update castling rights: one AND against the per-square masks
+    prev_cr = new.castling_rights
+    cr = prev_cr & CR_MASK[mv.from_sq] & CR_MASK[mv.to_sq]
+    h ^= table.castling_xor_table[prev_cr ^ cr]
+    new.castling_rights = cr
 
     # Set EP square after double pawn push
     if mv.is_double_push:
@@ -330,16 +419,17 @@ def apply_move_clone(pos: 'Position', mv: Move) -> 'Position':
             new.ep_square = mv.from_sq + 8
         else:
             new.ep_square = mv.from_sq - 8
+        h ^= ef[new.ep_square % 8]
 
-    # Update occupancies
-    new.white_occupancy = (
-        new.bitboards[0] | new.bitboards[1] | new.bitboards[2] |
-        new.bitboards[3] | new.bitboards[4] | new.bitboards[5]
-    )
-    new.black_occupancy = (
-        new.bitboards[6] | new.bitboards[7] | new.bitboards[8] |
-        new.bitboards[9] | new.bitboards[10] | new.bitboards[11]
-    )
+    # Update occupancies incrementally (clone starts from a valid state)
+    if side == WHITE:
+        new.white_occupancy ^= own_delta
+        if cap_bit:
+            new.black_occupancy ^= cap_bit
+    else:
+        new.black_occupancy ^= own_delta
+        if cap_bit:
+            new.white_occupancy ^= cap_bit
     new.all_occupancy = new.white_occupancy | new.black_occupancy
 
     # Clocks
@@ -352,26 +442,157 @@ def apply_move_clone(pos: 'Position', mv: Move) -> 'Position':
 
     # Toggle side
     new.side_to_move = 1 - side
-
-    # Zobrist recompute (simple)
-    new.zobrist = new.zobrist_table.compute(new)
+    new.zobrist = h ^ table.side
 
     return new
 
 
-def generate_legal_moves(pos: 'Position') -> List[Move]:
-    legal: List[Move] = []
-    for mv in generate_pseudo_legal_moves(pos):
-        after = apply_move_clone(pos, mv)
-        # Check side not in check after move
-        if after.side_to_move == WHITE:
-            # we just moved BLACK
-            king_sq = (after.bitboards[11]).bit_length() - 1
-            if not is_square_attacked_by(WHITE, king_sq, after):
-                legal.append(mv)
+# Scratch buffer for the pseudo-legal stage of generate_legal_moves.
+# Safe to share: the legality loop only calls make/undo, never re-enters
+# the generator, and the surviving moves go into a fresh list.
+_PSEUDO_BUF: List[Move] = []
+
+
+def _legality_masks(pos: 'Position', mover: int, king_idx: int, opp: int):
+    """Pin/check analysis done once per position.
+
+    Returns (pinned, pin_masks, block_mask):
+      pinned     - bitboard of own pinned pieces
+      pin_masks  - per pinned from-square, the destinations that keep the
+                   pin ray closed (ray squares plus the pinning slider)
+      block_mask - if in check, the destinations that resolve it for
+                   non-king moves (block or capture the checker); all
+                   squares when not in check, 0 in double check
+    """
+    bbs = pos.bitboards
+    king_sq = bbs[king_idx].bit_length() - 1
+    occ = pos.all_occupancy
+    own = pos.white_occupancy if mover == WHITE else pos.black_occupancy
+    base = opp * 6
+    rq = bbs[base + 3] | bbs[base + 4]
+    bq = bbs[base + 2] | bbs[base + 4]
+
+    checkers = (
+        (KNIGHT_ATTACKS[king_sq] & bbs[base + 1])
+        | (PAWN_ATTACKERS[(opp << 6) | king_sq] & bbs[base])
+        | (rook_attacks(king_sq, occ) & rq)
+        | (bishop_attacks(king_sq, occ) & bq)
+    )
+
+    # Snipers: opposing sliders that would hit the king on an empty board;
+    # exactly one own piece on the ray between them means a pin
+    pinned = 0
+    pin_masks = {}
+    snipers = (rook_attacks(king_sq, 0) & rq) | (bishop_attacks(king_sq, 0) & bq)
+    while snipers:
+        lsb = snipers & -snipers
+        snipers ^= lsb
+        ray = BETWEEN[(king_sq << 6) | (lsb.bit_length() - 1)]
+        blockers = ray & occ
+        if blockers and not (blockers & (blockers - 1)) and (blockers & own):
+            pinned |= blockers
+            pin_masks[blockers.bit_length() - 1] = ray | lsb
+
+    if checkers:
+        if checkers & (checkers - 1):
+            block_mask = 0  # double check: only the king can move
         else:
-            king_sq = (after.bitboards[5]).bit_length() - 1
-            if not is_square_attacked_by(BLACK, king_sq, after):
-                legal.append(mv)
+            block_mask = BETWEEN[(king_sq << 6) | (checkers.bit_length() - 1)] | checkers
+    else:
+        block_mask = _MASK64
+    return pinned, pin_masks, block_mask
+
+
+def iter_legal_moves(pos: 'Position'):
+    # Generator form of generate_legal_moves; lets callers stop early
+    # (or sample) without materializing the whole list.
+    # The mover is known before the loop, so resolve its king index and
+    # the attacking side once instead of branching on side_to_move per move
+    mover = pos.side_to_move
+    king_idx = 5 if mover == WHITE else 11
+    opp = 1 - mover
+    bbs = pos.bitboards
+    pinned, pin_masks, block_mask = _legality_masks(pos, mover, king_idx, opp)
+    for mv in generate_pseudo_legal_moves(pos):
+        if mv.piece == king_idx or mv.is_en_passant:
+            if mv.is_castling:
+                # Generator already verified path and attacked squares
+                yield mv
+                continue
+            # King moves (sliders may see through the vacated square) and
+            # EP (horizontal discovered checks) keep the make/undo check
+            pos.make_move(mv)
+            king_sq = bbs[king_idx].bit_length() - 1
+            ok = not is_square_attacked_by(opp, king_sq, pos)
+            pos.undo_move()
+            if ok:
+                yield mv
+            continue
+        to_bit = 1 << mv.to_sq
+        if not (to_bit & block_mask):
+            continue
+        if ((1 << mv.from_sq) & pinned) and not (to_bit & pin_masks[mv.from_sq]):
+            continue
+        yield mv
+
+
+def _filter_legal(pos: 'Position', pseudo: List[Move]) -> List[Move]:
+    legal: List[Move] = []
+    append = legal.append
+    mover = pos.side_to_move
+    king_idx = 5 if mover == WHITE else 11
+    opp = 1 - mover
+    bbs = pos.bitboards
+    # Pin/check masks computed once: the large majority of pseudo-legal
+    # moves is then classified without playing them
+    pinned, pin_masks, block_mask = _legality_masks(pos, mover, king_idx, opp)
+    for mv in pseudo:
+        if mv.piece == king_idx or mv.is_en_passant:
+            if mv.is_castling:
+                # Generator already verified path and attacked squares
+                append(mv)
+                continue
+            # King moves (sliders may see through the vacated square) and
+            # EP (horizontal discovered checks) keep the make/undo check
+            pos.make_move(mv)
+            king_sq = bbs[king_idx].bit_length() - 1
+            if not is_square_attacked_by(opp, king_sq, pos):
+                append(mv)
+            pos.undo_move()
+            continue
+        to_bit = 1 << mv.to_sq
+        if not (to_bit & block_mask):
+            continue
+        if ((1 << mv.from_sq) & pinned) and not (to_bit & pin_masks[mv.from_sq]):
+            continue
+        append(mv)
     return legal
 
+
+def generate_legal_moves(pos: 'Position') -> List[Move]:
+    return _filter_legal(pos, generate_pseudo_legal_moves(pos, _PSEUDO_BUF))
+
+
+def generate_captures(pos: 'Position') -> List[Move]:
+    # Noisy legal moves only: captures, en passant and promotions.
+    # Staged search tries these before bothering to generate quiets
+    return _filter_legal(pos, generate_pseudo_legal_moves(pos, _PSEUDO_BUF, GEN_NOISY))
+
+
+def generate_quiets(pos: 'Position') -> List[Move]:
+    return _filter_legal(pos, generate_pseudo_legal_moves(pos, _PSEUDO_BUF, GEN_QUIET))
+
+
+def generate_legal_moves_from(pos: 'Position', from_sq: int) -> List[Move]:
+    # Legal moves originating from one square, for UCI move replay: only
+    # the handful of candidates from that square pay the legality check
+    generate_pseudo_legal_moves(pos, _PSEUDO_BUF)
+    return _filter_legal(pos, [m for m in _PSEUDO_BUF if m.from_sq == from_sq])
+
+
+def generate_pseudolegal_captures(pos: 'Position') -> List[Move]:
+    # Unfiltered noisy moves. Returns a fresh list (no shared buffer):
+    # qsearch keeps iterating it across its own recursion and checks
+    # legality itself after make_move
+    return generate_pseudo_legal_moves(pos, None, GEN_NOISY)
+
@@ -3,9 +3,14 @@ from dataclasses import dataclass
 
 from zobrist import Zobrist
 from eval import eval_components, apply_move_eval_delta
+from constants import CR_MASK
 
 WHITE, BLACK = 0, 1
 
+# Shared Zobrist key tables: immutable after construction, so one
+# module-level instance serves every Position
+_ZOBRIST = Zobrist()
+
 # Piece indices: 0..11 (WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK)
 PIECE_TO_INDEX = {
     'P': 0, 'N': 1, 'B': 2, 'R': 3, 'Q': 4, 'K': 5,
@@ -48,7 +53,7 @@ class Position:
         'bitboards', 'white_occupancy', 'black_occupancy', 'all_occupancy',
         'side_to_move', 'castling_rights', 'ep_square', 'halfmove_clock',
         'fullmove_number', 'zobrist_table', 'zobrist', 'mg', 'eg', 'phase',
-        'move_stack'
+        'move_stack', 'mailbox'
     )
 
     def __init__(self):
@@ -61,12 +66,14 @@ class Position:
         self.ep_square: Optional[int] = None
         self.halfmove_clock = 0
         self.fullmove_number = 1
-        self.zobrist_table = Zobrist()
+        self.zobrist_table = _ZOBRIST
         self.zobrist = 0
         self.mg = 0
         self.eg = 0
         self.phase = 0
         self.move_stack = []
+        # Incremental mailbox: piece index per square, 255 = empty
+        self.mailbox = bytearray(b'\xff' * 64)
 
     @classmethod
     def from_fen(cls, fen: str) -> 'Position':
@@ -92,6 +99,7 @@ class Position:
             sq = _square_index(file_idx, rank)
             self_idx = PIECE_TO_INDEX[ch]
             pos.bitboards[self_idx] |= (1 << sq)
+            pos.mailbox[sq] = self_idx
             file_idx += 1
 
         # Side to move
@@ -117,15 +125,10 @@ class Position:
         pos.halfmove_clock = int(halfmove)
         pos.fullmove_number = int(fullmove)
 
-        # Occupancies
-        pos.white_occupancy = (
-            pos.bitboards[0] | pos.bitboards[1] | pos.bitboards[2] |
-            pos.bitboards[3] | pos.bitboards[4] | pos.bitboards[5]
-        )
-        pos.black_occupancy = (
-            pos.bitboards[6] | pos.bitboards[7] | pos.bitboards[8] |
-            pos.bitboards[9] | pos.bitboards[10] | pos.bitboards[11]
-        )
+        # Occupancies (only full recompute left; make/undo are incremental)
+        bb = pos.bitboards
+        pos.white_occupancy = bb[0] | bb[1] | bb[2] | bb[3] | bb[4] | bb[5]
+        pos.black_occupancy = bb[6] | bb[7] | bb[8] | bb[9] | bb[10] | bb[11]
         pos.all_occupancy = pos.white_occupancy | pos.black_occupancy
 
         # Zobrist
@@ -135,6 +138,7 @@ class Position:
         return pos
 
     def to_fen(self) -> str:
+        bb = self.bitboards
         rows = []
         for rank in range(8, 0, -1):
             empties = 0
@@ -143,7 +147,7 @@ class Position:
                 sq = _square_index(file_idx, rank)
                 ch = None
                 for p in range(12):
-                    if (self.bitboards[p] >> sq) & 1:
+                    if (bb[p] >> sq) & 1:
                         ch = INDEX_TO_PIECE_CHAR[p]
                         break
                 if ch is None:
@@ -181,12 +185,13 @@ class Position:
             s += 'q'
         return s
     def piece_at(self, sq: int):
-        for p in range(12):
-            if (self.bitboards[p] >> sq) & 1:
-                return p
+        p = self.mailbox[sq]
+        return None if p == 255 else p
 
     def clone(self) -> 'Position':
-        c = Position()
+        # __new__ skips __init__ (which would allocate throwaway lists
+        # just to overwrite them here)
+        c = Position.__new__(Position)
         c.bitboards = self.bitboards[:]
         c.white_occupancy = self.white_occupancy
         c.black_occupancy = self.black_occupancy
@@ -201,11 +206,16 @@ class Position:
         c.mg = self.mg
         c.eg = self.eg
         c.phase = self.phase
+        c.mailbox = self.mailbox[:]
         # Note: move_stack not cloned for pure position snapshot
+        c.move_stack = []
         return c
 
     def make_move(self, mv):
         table = self.zobrist_table
+        ps = table.piece_square
+        ck = table.castling_xor_table
+        eh = table.ep_hash
         side = self.side_to_move
         # Save undo snapshot
         undo = UndoEntry(
@@ -222,37 +232,43 @@ class Position:
         )
         self.move_stack.append(undo)
 
-        # Remove EP from Zobrist
-        if self.ep_square is not None:
-            self.zobrist ^= table.ep_file_keys[self.ep_square % 8]
+        # Remove EP from Zobrist: index 64 is the "no ep" sentinel (key 0)
+        ep = self.ep_square
+        self.zobrist ^= eh[64 if ep is None else ep]
         self.ep_square = None
 
         from_bit = 1 << mv.from_sq
         to_bit = 1 << mv.to_sq
 
         # Zobrist: toggle moving piece from square
-        self.zobrist ^= table.piece_square[mv.piece][mv.from_sq]
+        self.zobrist ^= ps[mv.piece][mv.from_sq]
         # Remove moving piece
         self.bitboards[mv.piece] &= ~from_bit
-
-        # Handle captures
+        mailbox = self.mailbox
+        mailbox[mv.from_sq] = 255
+        own_delta = from_bit ^ to_bit
+        cap_bit = 0
+
+        # Unified capture path: resolve the captured square/piece up front
+        # (EP victims sit behind the destination square) so one branch
+        # handles both EP and normal captures
         if mv.is_en_passant:
-            if side == WHITE:
-                cap_sq = mv.to_sq - 8
-                self.bitboards[6] &= ~(1 << cap_sq)
-                self.zobrist ^= table.piece_square[6][cap_sq]
-            else:
-                cap_sq = mv.to_sq + 8
-                self.bitboards[0] &= ~(1 << cap_sq)
-                self.zobrist ^= table.piece_square[0][cap_sq]
-        elif mv.capture_piece is not None:
-            self.bitboards[mv.capture_piece] &= ~to_bit
-            self.zobrist ^= table.piece_square[mv.capture_piece][mv.to_sq]
+            cap_sq = mv.to_sq - 8 if side == WHITE else mv.to_sq + 8
+            cap_piece = 6 if side == WHITE else 0
+        else:
+            cap_sq = mv.to_sq
+            cap_piece = mv.capture_piece
+        if cap_piece is not None:
+            cap_bit = 1 << cap_sq
+            self.bitboards[cap_piece] &= ~cap_bit
+            self.zobrist ^= ps[cap_piece][cap_sq]
+            mailbox[cap_sq] = 255
 
         # Place moving or promoted piece
         dst_piece = mv.promotion if mv.promotion is not None else mv.piece
         self.bitboards[dst_piece] |= to_bit
-        self.zobrist ^= table.piece_square[dst_piece][mv.to_sq]
+        self.zobrist ^= ps[dst_piece][mv.to_sq]
+        mailbox[mv.to_sq] = dst_piece
 
         # Castling rook move
         if mv.is_castling:
@@ -260,62 +276,43 @@ class Position:
                 if mv.to_sq == 6:  # e1->g1
                     self.bitboards[3] &= ~(1 << 7)
                     self.bitboards[3] |= (1 << 5)
-                    self.zobrist ^= table.piece_square[3][7]
-                    self.zobrist ^= table.piece_square[3][5]
+                    self.zobrist ^= ps[3][7]
+                    self.zobrist ^= ps[3][5]
+                    mailbox[7] = 255
+                    mailbox[5] = 3
+                    own_delta ^= 0xA0  # bits 5 and 7
                 else:  # e1->c1
                     self.bitboards[3] &= ~(1 << 0)
                     self.bitboards[3] |= (1 << 3)
-                    self.zobrist ^= table.piece_square[3][0]
-                    self.zobrist ^= table.piece_square[3][3]
+                    self.zobrist ^= ps[3][0]
+                    self.zobrist ^= ps[3][3]
+                    mailbox[0] = 255
+                    mailbox[3] = 3
+                    own_delta ^= 0x09  # bits 0 and 3
             else:
                 if mv.to_sq == 62:  # e8->g8
                     self.bitboards[9] &= ~(1 << 63)
                     self.bitboards[9] |= (1 << 61)
-                    self.zobrist ^= table.piece_square[9][63]
-                    self.zobrist ^= table.piece_square[9][61]
+                    self.zobrist ^= ps[9][63]
+                    self.zobrist ^= ps[9][61]
+                    mailbox[63] = 255
+                    mailbox[61] = 9
+                    own_delta ^= (1 << 63) | (1 << 61)
                 else:  # e8->c8
                     self.bitboards[9] &= ~(1 << 56)
                     self.bitboards[9] |= (1 << 59)
-                    self.zobrist ^= table.piece_square[9][56]
-                    self.zobrist ^= table.piece_square[9][59]
-
-        # Update castling rights and Zobrist toggles
+                    self.zobrist ^= ps[9][56]
+                    self.zobrist ^= ps[9][59]
+                    mailbox[56] = 255
+                    mailbox[59] = 9
+                    own_delta ^= (1 << 56) | (1 << 59)
+
+        # Update castling rights: one AND against the per-square masks
+        # (touching a king/rook home square drops the matching rights)
         prev_cr = self.castling_rights
-        cr = prev_cr
-        if side == WHITE:
-            if mv.piece == 5:
-                cr &= ~(CR_WK | CR_WQ)
-            elif mv.piece == 3:
-                if mv.from_sq == 0:
-                    cr &= ~CR_WQ
-                elif mv.from_sq == 7:
-                    cr &= ~CR_WK
-            if mv.capture_piece == 9:
-                if mv.to_sq == 56:
-                    cr &= ~CR_BQ
-                elif mv.to_sq == 63:
-                    cr &= ~CR_BK
-        else:
-            if mv.piece == 11:
-                cr &= ~(CR_BK | CR_BQ)
-            elif mv.piece == 9:
-                if mv.from_sq == 56:
-                    cr &= ~CR_BQ
-                elif mv.from_sq == 63:
-                    cr &= ~CR_BK
-            if mv.capture_piece == 3:
-                if mv.to_sq == 0:
-                    cr &= ~CR_WQ
-                elif mv.to_sq == 7:
-                    cr &= ~CR_WK
-        # Toggle changed castling rights in Zobrist
-        def _toggle_cr(bit: int, key_idx: int):
-            if (prev_cr & bit) != (cr & bit):
-                self.zobrist ^= table.castling_keys[key_idx]
-        _toggle_cr(CR_WK, 0)
-        _toggle_cr(CR_WQ, 1)
-        _toggle_cr(CR_BK, 2)
-        _toggle_cr(CR_BQ, 3)
+        cr = prev_cr & CR_MASK[mv.from_sq] & CR_MASK[mv.to_sq]
+        # One lookup covers every combination of changed rights
+        self.zobrist ^= ck[prev_cr ^ cr]
         self.castling_rights = cr
 
         # Set EP square after double push (and Zobrist)
@@ -324,17 +321,18 @@ class Position:
                 self.ep_square = mv.from_sq + 8
             else:
                 self.ep_square = mv.from_sq - 8
-            self.zobrist ^= table.ep_file_keys[self.ep_square % 8]
+            self.zobrist ^= eh[self.ep_square]
 
-        # Update occupancies
-        self.white_occupancy = (
-            self.bitboards[0] | self.bitboards[1] | self.bitboards[2] |
-            self.bitboards[3] | self.bitboards[4] | self.bitboards[5]
-        )
-        self.black_occupancy = (
-            self.bitboards[6] | self.bitboards[7] | self.bitboards[8] |
-            self.bitboards[9] | self.bitboards[10] | self.bitboards[11]
-        )
+        # Update occupancies incrementally: XOR the mover (and rook) bits
+        # into the side occupancy, clear the captured bit from the other
+        if side == WHITE:
+            self.white_occupancy ^= own_delta
+            if cap_bit:
+                self.black_occupancy ^= cap_bit
+        else:
+            self.black_occupancy ^= own_delta
+            if cap_bit:
+                self.white_occupancy ^= cap_bit
         self.all_occupancy = self.white_occupancy | self.black_occupancy
 
         # Clocks
@@ -352,6 +350,28 @@ class Position:
         self.side_to_move = 1 - side
         self.zobrist ^= table.side
 
+    def make_null_move(self):
+        """Pass the move in place: only side, EP and clocks change.
+
+        Returns the saved state to hand back to undo_null_move; the
+        Zobrist update is two XORs instead of a full recompute.
+        """
+        table = self.zobrist_table
+        state = (self.ep_square, self.halfmove_clock, self.fullmove_number, self.zobrist)
+        if self.ep_square is not None:
+            self.zobrist ^= table.ep_hash[self.ep_square]
+            self.ep_square = None
+        self.halfmove_clock += 1
+        if self.side_to_move == BLACK:
+            self.fullmove_number += 1
+        self.side_to_move = 1 - self.side_to_move
+        self.zobrist ^= table.side
+        return state
+
+    def undo_null_move(self, state):
+        self.ep_square, self.halfmove_clock, self.fullmove_number, self.zobrist = state
+        self.side_to_move = 1 - self.side_to_move
+
     def undo_move(self):
         if not self.move_stack:
             raise IndexError('No moves to undo')
@@ -361,6 +381,9 @@ class Position:
 
         from_bit = 1 << mv.from_sq
         to_bit = 1 << mv.to_sq
+        mailbox = self.mailbox
+        own_delta = from_bit ^ to_bit
+        cap_bit = 0
 
         # Reverse castling rook move
         if mv.is_castling:
@@ -368,34 +391,49 @@ class Position:
                 if mv.to_sq == 6:
                     self.bitboards[3] &= ~(1 << 5)
                     self.bitboards[3] |= (1 << 7)
+                    mailbox[5] = 255
+                    mailbox[7] = 3
+                    own_delta ^= 0xA0
                 else:
                     self.bitboards[3] &= ~(1 << 3)
                     self.bitboards[3] |= (1 << 0)
+                    mailbox[3] = 255
+                    mailbox[0] = 3
+                    own_delta ^= 0x09
             else:
                 if mv.to_sq == 62:
                     self.bitboards[9] &= ~(1 << 61)
                     self.bitboards[9] |= (1 << 63)
+                    mailbox[61] = 255
+                    mailbox[63] = 9
+                    own_delta ^= (1 << 63) | (1 << 61)
                 else:
                     self.bitboards[9] &= ~(1 << 59)
                     self.bitboards[9] |= (1 << 56)
+                    mailbox[59] = 255
+                    mailbox[56] = 9
+                    own_delta ^= (1 << 56) | (1 << 59)
 
         # Remove moved piece from destination (promotion-aware)
         dst_piece = mv.promotion if mv.promotion is not None else mv.piece
         self.bitboards[dst_piece] &= ~to_bit
+        mailbox[mv.to_sq] = 255
 
-        # Restore captured piece
+        # Restore captured piece (unified EP/normal path as in make_move)
         if mv.is_en_passant:
-            if side == WHITE:
-                cap_sq = mv.to_sq - 8
-                self.bitboards[6] |= (1 << cap_sq)
-            else:
-                cap_sq = mv.to_sq + 8
-                self.bitboards[0] |= (1 << cap_sq)
-        elif mv.capture_piece is not None:
-            self.bitboards[mv.capture_piece] |= to_bit
+            cap_sq = mv.to_sq - 8 if side == WHITE else mv.to_sq + 8
+            cap_piece = 6 if side == WHITE else 0
+        else:
+            cap_sq = mv.to_sq
+            cap_piece = mv.capture_piece
+        if cap_piece is not None:
+            cap_bit = 1 << cap_sq
+            self.bitboards[cap_piece] |= cap_bit
+            mailbox[cap_sq] = cap_piece
 
         # Restore moving piece to from_sq
         self.bitboards[mv.piece] |= from_bit
+        mailbox[mv.from_sq] = mv.piece
 
         # Restore state from undo snapshot
         self.ep_square = u.prev_ep_square
@@ -404,15 +442,16 @@ class Position:
         self.fullmove_number = u.prev_fullmove_number
         self.side_to_move = u.prev_side_to_move
 
-        # Recompute occupancies
-        self.white_occupancy = (
-            self.bitboards[0] | self.bitboards[1] | self.bitboards[2] |
-            self.bitboards[3] | self.bitboards[4] | self.bitboards[5]
-        )
-        self.black_occupancy = (
-            self.bitboards[6] | self.bitboards[7] | self.bitboards[8] |
-            self.bitboards[9] | self.bitboards[10] | self.bitboards[11]
-        )
+        # Occupancies: the XOR deltas are symmetric, so re-applying them
+        # restores the pre-move state
+        if side == WHITE:
+            self.white_occupancy ^= own_delta
+            if cap_bit:
+                self.black_occupancy ^= cap_bit
+        else:
+            self.black_occupancy ^= own_delta
+            if cap_bit:
+                self.white_occupancy ^= cap_bit
         self.all_occupancy = self.white_occupancy | self.black_occupancy
 
         # Restore eval components and Zobrist
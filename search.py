@@ -1,22 +1,18 @@
-from dataclasses import dataclass
 from typing import Optional, List, Callable
 import time
 
 from constants import WHITE, BLACK
-from moves import Move, generate_legal_moves, is_square_attacked_by
-from eval import evaluate, PIECE_VALUES, see # <-- THÊM 'see' VÀO IMPORT
+from moves import Move, generate_legal_moves, generate_captures, generate_quiets, generate_pseudolegal_captures, is_square_attacked_by
+from eval import evaluate, PIECE_VALUES, PV12, see # <-- THÊM 'see' VÀO IMPORT
 
 MATE_SCORE = 1000000
 EXACT, LOWER, UPPER = 0, 1, 2
+MAX_PLY = 128
 
-
-@dataclass
-class TTEntry:
-    key: int
-    depth: int
-    score: int
-    flag: int
-    best_move: Optional[Move]
+# Fixed-size transposition table: entries live in a flat list indexed by
+# zobrist & TT_MASK, as (key, depth, score, flag, best_move) tuples
+TT_SIZE = 1 << 20
+TT_MASK = TT_SIZE - 1
 
 
 def _sq_name(sq: int) -> str:
@@ -25,73 +21,88 @@ def _sq_name(sq: int) -> str:
 
 class Search:
     def __init__(self):
-        self.tt: dict[int, TTEntry] = {}
+        self.tt: list[Optional[tuple]] = [None] * TT_SIZE
+        # TT generation: bumped per game so stale entries lose
+        # replacement priority without an O(TT) clear
+        self.age: int = 0
         self.nodes: int = 0
-        self.deadline: Optional[float] = None
-        # Killer moves: up to two quiet moves per ply
-        self.killers: dict[int, list[tuple[int, int, Optional[int]]]] = {}
-        # History heuristic: key=(from,to), value accumulated weight
-        self.history: dict[tuple[int, int], int] = {}
+        # Infinity when no time limit is set, so the per-node check is a
+        # single comparison with no None test
+        self.deadline: float = float('inf')
+        # Killer moves: up to two quiet moves per ply (packed move keys),
+        # preallocated per ply so the hot path indexes a list instead of
+        # probing a dict
+        self.killers: list[list[int]] = [[] for _ in range(MAX_PLY)]
+        # History heuristic: flat table indexed (from << 6) | to
+        self.history: list[int] = [0] * 4096
         # Stop control flags
         self.stop_requested: bool = False
         self.out_of_time: bool = False
-        # Cache cho SEE để tránh tính toán lại trong một lần sắp xếp
-        self.see_cache: dict[tuple[int, int, Optional[int]], int] = {}
-
-    def _in_check(self, pos) -> bool:
-        side = pos.side_to_move
-        king_sq = (pos.bitboards[5 if side == WHITE else 11]).bit_length() - 1
-        return is_square_attacked_by(1 - side, king_sq, pos)
+        # Best root move of the current iteration, for cheap info
+        # emissions without a TT walk
+        self.root_pv: List[Move] = []
 
-    def _is_quiet(self, mv: Move) -> bool:
-        return mv.capture_piece is None and not mv.is_en_passant and mv.promotion is None
+    def _in_check(self, pos, side: int) -> bool:
+        bbs = pos.bitboards
+        if side == WHITE:
+            return is_square_attacked_by(BLACK, bbs[5].bit_length() - 1, pos)
+        return is_square_attacked_by(WHITE, bbs[11].bit_length() - 1, pos)
 
     def _has_non_pawn_material(self, pos, side: int) -> bool:
+        bbs = pos.bitboards
         if side == WHITE:
-            return (pos.bitboards[1] | pos.bitboards[2] | pos.bitboards[3] | pos.bitboards[4]) != 0
-        else:
-            return (pos.bitboards[7] | pos.bitboards[8] | pos.bitboards[9] | pos.bitboards[10]) != 0
-
-    # Hàm trợ giúp mới để lấy điểm SEE đã cache
-    def _get_see_score(self, pos, mv) -> int:
-        # Dùng tuple đơn giản làm key
-        key = (mv.from_sq, mv.to_sq, mv.promotion)
-        if key in self.see_cache:
-            return self.see_cache[key]
-        
+            return (bbs[1] | bbs[2] | bbs[3] | bbs[4]) != 0
+        return (bbs[7] | bbs[8] | bbs[9] | bbs[10]) != 0
+
+    # Hàm trợ giúp để lấy điểm SEE đã cache; cache sống theo từng node
+    # (caller cấp dict), nên qsearch không phải tính SEE hai lần cho
+    # cùng một nước
+    def _get_see_score(self, pos, mv, cache: dict) -> int:
+        key = mv._key
+        if key in cache:
+            return cache[key]
+
         score = 0
         if mv.is_en_passant:
             # SEE cho en passant luôn là lời 1 Tốt
-            score = PIECE_VALUES[0] 
+            score = PIECE_VALUES[0]
         elif mv.capture_piece is not None:
             score = see(pos, mv)
-        
-        self.see_cache[key] = score
+
+        cache[key] = score
         return score
 
-    def _move_order(self, pos, moves: List[Move], tt_move: Optional[Move], ply: int) -> List[Move]:
+    def _move_order(self, pos, moves: List[Move], tt_key: int, ply: int, see_cache: dict) -> List[int]:
         """
-        Sắp xếp nước đi, thay thế MVV-LVA bằng SEE.
+        Chấm điểm nước đi, thay thế MVV-LVA bằng SEE.
         Thứ tự:
         1. TT Move
         2. Promotions
         3. Good Captures (SEE >= 0)
         4. Quiet Moves (Killers, History)
         5. Bad Captures (SEE < 0)
-        """
-        # Xóa cache SEE cho mỗi lần sắp xếp mới
-        self.see_cache.clear() 
 
-        scores = {}
+        Trả về danh sách điểm song song với `moves`, KHÔNG sắp xếp:
+        vòng lặp tìm kiếm tự chọn nước tốt nhất còn lại (selection),
+        nên beta cutoff sớm không phải trả chi phí sort toàn bộ.
+        """
+        scores = []
+        push = scores.append
+        # Các tra cứu bất biến theo vòng lặp, bind một lần
+        km = self.killers[ply]
+        k1 = km[0] if km else -1
+        k2 = km[1] if len(km) > 1 else -1
+        history = self.history
+        get_see = self._get_see_score
         for mv in moves:
             score = 0
-            if tt_move is not None and mv.from_sq == tt_move.from_sq and mv.to_sq == tt_move.to_sq and mv.promotion == tt_move.promotion:
+            if mv._key == tt_key:
                 score = 100000  # 1. TT move luôn cao nhất
             elif mv.promotion is not None:
                 # 2. Promotions
-                score = 500 + PIECE_VALUES[mv.promotion % 6]
+                score = 500 + PV12[mv.promotion]
             elif mv.capture_piece is not None or mv.is_en_passant:
-                see_score = self._get_see_score(pos, mv)
+                see_score = get_see(pos, mv, see_cache)
                 if see_score >= 0:
                     # 3. Good captures (lời hoặc hòa vốn)
                     score = 1000 + see_score
@@ -100,63 +111,92 @@ class Search:
                     score = -1000 + see_score # Để nó sau quiet moves
             else:
                 # 4. Quiet moves
-                score = 0 # Điểm cơ bản
-                km = self.killers.get(ply)
-                if km:
-                    if mv.from_sq == km[0][0] and mv.to_sq == km[0][1] and mv.promotion == km[0][2]:
-                        score += 80000 # Killer 1
-                    elif len(km) > 1 and mv.from_sq == km[1][0] and mv.to_sq == km[1][1] and mv.promotion == km[1][2]:
-                        score += 70000 # Killer 2
-                
-                # Cộng điểm History
-                score += self.history.get((mv.from_sq, mv.to_sq), 0)
-            
-            scores[mv] = score
-        
-        # Sắp xếp tất cả một lần dựa trên điểm số
-        return sorted(moves, key=lambda m: scores[m], reverse=True)
+                if mv._key == k1:
+                    score += 80000 # Killer 1
+                elif mv._key == k2:
+                    score += 70000 # Killer 2
+
+                # Cộng điểm History (key >> 6 là (from << 6) | to)
+                score += history[mv._key >> 6]
+
+            push(score)
+
+        return scores
 
     # HÀM _ordered_captures ĐÃ BỊ XÓA BỎ VÌ KHÔNG CẦN THIẾT NỮA
 
     def request_stop(self) -> None:
         self.stop_requested = True
 
+    def clear_tt(self) -> None:
+        # Keep the fixed size; just empty every slot
+        self.tt = [None] * TT_SIZE
+
+    def new_game(self) -> None:
+        # O(1) replacement for clearing the TT between games: bump the
+        # generation so every existing entry becomes stale and gets
+        # overwritten on first contention. Killers and history are tiny
+        # and game-specific, so those do reset
+        self.age = (self.age + 1) & 0xFF
+        for km in self.killers:
+            km.clear()
+        self.history = [0] * 4096
+
     def qsearch(self, pos, alpha: int, beta: int) -> int:
         """
         Quiescence search - cập nhật để chỉ tìm kiếm các nước SEE >= 0
         """
         self.nodes += 1
         # Early abort on stop/time
-        if self.stop_requested or (self.deadline is not None and self.nodes % 2048 == 0 and time.monotonic() > self.deadline):
+        if self.stop_requested or (self.nodes & 0xFFF == 0 and time.monotonic() > self.deadline):
             self.out_of_time = True
             return alpha
             
-        stand_pat = evaluate(pos)
+        stand_pat = evaluate(pos, alpha, beta)
         if stand_pat >= beta:
             return beta
         if alpha < stand_pat:
             alpha = stand_pat
             
-        legal = generate_legal_moves(pos)
-        
-        # Lấy tất cả các nước đi "ồn ào" (captures/promotions)
-        noisy_moves = []
-        for mv in legal:
-            if mv.capture_piece is not None or mv.is_en_passant or mv.promotion is not None:
-                noisy_moves.append(mv)
-        
-        # Sắp xếp các nước đi ồn ào bằng logic _move_order (đã bao gồm SEE)
+        # Sinh nước ồn ào pseudo-legal; legality được kiểm sau make_move
+        # ngay trong vòng lặp (đa số node không bị chiếu, nên bỏ được
+        # cả lượt lọc pin/check lẫn danh sách thứ hai)
+        noisy_moves = generate_pseudolegal_captures(pos)
+
+        # Chấm điểm các nước đi ồn ào bằng logic _move_order (đã bao gồm SEE)
         # (ply=0 là tùy ý, vì qsearch không dùng killers)
-        ordered_noisy_moves = self._move_order(pos, noisy_moves, None, 0)
-        
-        for mv in ordered_noisy_moves:
+        see_cache: dict = {}
+        scores = self._move_order(pos, noisy_moves, 0, 0, see_cache)
+
+        side = pos.side_to_move
+        king_idx = 5 if side == WHITE else 11
+        opp = 1 - side
+        bbs = pos.bitboards
+
+        n = len(noisy_moves)
+        for i in range(n):
+            # Selection pick: đưa nước điểm cao nhất còn lại lên vị trí i
+            bi = i
+            bs = scores[i]
+            for j in range(i + 1, n):
+                if scores[j] > bs:
+                    bs = scores[j]
+                    bi = j
+            if bi != i:
+                noisy_moves[i], noisy_moves[bi] = noisy_moves[bi], noisy_moves[i]
+                scores[i], scores[bi] = scores[bi], scores[i]
+            mv = noisy_moves[i]
             # Tối ưu hóa QSearch: BỎ QUA các nước "bad capture" (lỗ)
             if mv.promotion is None: # Promotions luôn được xét
-                see_score = self._get_see_score(pos, mv)
+                see_score = self._get_see_score(pos, mv, see_cache)
                 if see_score < 0:
                     continue # Bỏ qua nước đi này
             
             pos.make_move(mv)
+            # Nước pseudo-legal để hở vua thì bỏ qua
+            if is_square_attacked_by(opp, bbs[king_idx].bit_length() - 1, pos):
+                pos.undo_move()
+                continue
             score = -self.qsearch(pos, -beta, -alpha)
             pos.undo_move()
             if score >= beta:
@@ -171,157 +211,345 @@ class Search:
             self.out_of_time = True
             return alpha
         # Optional time check
-        if self.deadline is not None and self.nodes % 2048 == 0:
-            if time.monotonic() > self.deadline:
-                self.out_of_time = True
-                return alpha
+        if self.nodes & 0xFFF == 0 and time.monotonic() > self.deadline:
+            self.out_of_time = True
+            return alpha
         self.nodes += 1
+        # Bind the hottest position attributes once per node
+        stm = pos.side_to_move
         key = pos.zobrist
-        tt = self.tt.get(key)
-        
+        tt = self.tt[key & TT_MASK]
+        if tt is not None and tt[0] != key:
+            tt = None  # slot holds a different position
+
         # --- TT Lookup ---
-        if tt is not None and tt.depth >= depth:
-            if tt.flag == EXACT:
-                return tt.score
-            if tt.flag == LOWER:
-                alpha = max(alpha, tt.score)
-            elif tt.flag == UPPER:
-                beta = min(beta, tt.score)
+        if tt is not None and tt[1] >= depth:
+            tt_score = tt[2]
+            tt_flag = tt[3]
+            if tt_flag == EXACT:
+                return tt_score
+            if tt_flag == LOWER:
+                alpha = max(alpha, tt_score)
+            elif tt_flag == UPPER:
+                beta = min(beta, tt_score)
             if alpha >= beta:
-                return tt.score
-        tt_move = tt.best_move if tt is not None else None
+                return tt_score
+        # Packed key của TT move (0 = không có)
+        tt_move_key = tt[4] if tt is not None else 0
 
         # --- Base Case ---
-        in_check = self._in_check(pos)
+        in_check = self._in_check(pos, stm)
         if depth <= 0:
             return self.qsearch(pos, alpha, beta)
 
         # --- Null-move pruning ---
-        if depth >= 2 and not in_check and self._has_non_pawn_material(pos, pos.side_to_move):
+        if depth >= 2 and not in_check and self._has_non_pawn_material(pos, stm):
             R = 3 if depth >= 5 else 2
-            side = pos.side_to_move
-            null_pos = pos.clone()
-            # Clear en passant and advance clocks appropriately
-            null_pos.ep_square = None
-            null_pos.halfmove_clock += 1
-            if side == BLACK:
-                null_pos.fullmove_number += 1
-            # Toggle side and recompute Zobrist
-            null_pos.side_to_move = 1 - side
-            null_pos.zobrist = null_pos.zobrist_table.compute(null_pos)
+            # In-place null move: no clone, two Zobrist XORs
+            null_state = pos.make_null_move()
             # Null-window search to detect fail-high quickly
-            score = -self.alphabeta(null_pos, depth - R - 1, -beta, -beta + 1, ply + 1, progress_cb)
+            score = -self._zws(pos, depth - R - 1, 1 - beta, ply + 1)
+            pos.undo_null_move(null_state)
             if score >= beta:
                 return beta
 
-        # --- Move Generation and Ordering ---
-        legal = generate_legal_moves(pos)
-        if not legal:
-            # terminal: mate or stalemate
-            if in_check:
-                return -MATE_SCORE + ply
-            return 0
-
+        # --- Staged Move Generation and Ordering ---
+        # Ồn ào trước (captures/EP/promotions), quiets chỉ được sinh khi
+        # giai đoạn ồn ào không tạo ra cutoff
         best_score = -MATE_SCORE
         best_move = None
-        # Sắp xếp nước đi sử dụng logic SEE mới
-        ordered = self._move_order(pos, legal, tt_move, ply)
-        
-        stand_pat = evaluate(pos) # Dùng cho futility pruning
+
+        # Chỉ dùng cho futility pruning, nên chỉ tính khi futility có thể
+        # kích hoạt (depth <= 2, không bị chiếu)
+        stand_pat = evaluate(pos, alpha, beta) if depth <= 2 and not in_check else 0
         a0 = alpha
         move_index = 0
-        
-        for mv in ordered:
-            move_index += 1
-            # Root progress info
-            if ply == 0 and progress_cb is not None:
-                progress_cb(mv, move_index, depth)
-                
-            # --- Pruning & Reductions ---
-            reduce = False
-            r = 0
-            
-            is_quiet = self._is_quiet(mv)
-            
-            # Late move reductions (LMR)
-            if depth >= 3 and is_quiet and not in_check and move_index > 4:
-                reduce = True
-                r = 1
-                
-            # Futility reductions
-            if depth <= 2 and not in_check and is_quiet:
-                margin = 150 if depth == 1 else 250
-                if stand_pat + margin <= alpha:
+        cutoff = False
+        see_cache: dict = {}
+
+        for stage_moves in (generate_captures(pos), None):
+            if stage_moves is None:
+                stage_moves = generate_quiets(pos)
+            if not stage_moves:
+                continue
+            # Chấm điểm theo logic SEE; chọn dần thay vì sort
+            scores = self._move_order(pos, stage_moves, tt_move_key, ply, see_cache)
+            n = len(stage_moves)
+
+            for i in range(n):
+                # Selection pick: đưa nước điểm cao nhất còn lại lên vị trí i
+                bi = i
+                bs = scores[i]
+                for j in range(i + 1, n):
+                    if scores[j] > bs:
+                        bs = scores[j]
+                        bi = j
+                if bi != i:
+                    stage_moves[i], stage_moves[bi] = stage_moves[bi], stage_moves[i]
+                    scores[i], scores[bi] = scores[bi], scores[i]
+                mv = stage_moves[i]
+                move_index += 1
+                # Root progress info
+                if ply == 0 and progress_cb is not None:
+                    progress_cb(mv, move_index, depth)
+
+                # --- Pruning & Reductions ---
+                reduce = False
+                r = 0
+
+                is_quiet = mv.quiet
+
+                # Late move reductions (LMR)
+                if depth >= 3 and is_quiet and not in_check and move_index > 4:
                     reduce = True
-                    r = max(r, 1)
-            
-            # --- Make Move & Search ---
-            pos.make_move(mv)
-            
-            # Principal Variation Search (PVS)
-            if move_index == 1:
-                score = -self.alphabeta(pos, depth - 1, -beta, -alpha, ply + 1, progress_cb)
-            else:
-                # zero-window probe
-                score = -self.alphabeta(pos, depth - 1 - r, -alpha - 1, -alpha, ply + 1, progress_cb)
-                if score > alpha:
-                    # re-search with full window
-                    score = -self.alphabeta(pos, depth - 1 - r, -beta, -alpha, ply + 1, progress_cb)
-                    
-            pos.undo_move()
-            
-            # Re-search if reduction was too aggressive
-            if reduce and score > alpha:
+                    r = 1
+
+                # Futility reductions
+                if depth <= 2 and not in_check and is_quiet:
+                    margin = 150 if depth == 1 else 250
+                    if stand_pat + margin <= alpha:
+                        reduce = True
+                        r = max(r, 1)
+
+                # --- Make Move & Search ---
                 pos.make_move(mv)
-                score = -self.alphabeta(pos, depth - 1, -beta, -alpha, ply + 1, progress_cb)
+
+                # Principal Variation Search (PVS)
+                if move_index == 1:
+                    score = -self.alphabeta(pos, depth - 1, -beta, -alpha, ply + 1, progress_cb)
+                else:
+                    # zero-window probe via the specialized searcher
+                    score = -self._zws(pos, depth - 1 - r, -alpha, ply + 1)
+                    if score > alpha:
+                        # re-search with full window
+                        score = -self.alphabeta(pos, depth - 1 - r, -beta, -alpha, ply + 1, progress_cb)
+
                 pos.undo_move()
 
-            # --- Update Best Move & Alpha/Beta ---
-            if score > best_score:
-                best_score = score
-                best_move = mv
-                
-            if score >= beta:
-                # Fail-high (Beta cutoff)
-                if is_quiet:
-                    # Cập nhật Killers và History
-                    km = self.killers.get(ply, [])
-                    key_tpl = (mv.from_sq, mv.to_sq, mv.promotion)
-                    if not km or km[0] != key_tpl:
-                        km = [key_tpl] + [k for k in km if k != key_tpl]
-                    if len(km) > 2:
-                        km = km[:2]
-                    self.killers[ply] = km
-                    self.history[(mv.from_sq, mv.to_sq)] = self.history.get((mv.from_sq, mv.to_sq), 0) + depth * depth
-                break # Cắt tỉa
-                
-            if score > alpha:
-                alpha = score
-                
+                # Re-search if reduction was too aggressive
+                if reduce and score > alpha:
+                    pos.make_move(mv)
+                    score = -self.alphabeta(pos, depth - 1, -beta, -alpha, ply + 1, progress_cb)
+                    pos.undo_move()
+
+                # --- Update Best Move & Alpha/Beta ---
+                if score > best_score:
+                    best_score = score
+                    best_move = mv
+                    if ply == 0:
+                        self.root_pv = [mv]
+
+                if score >= beta:
+                    # Fail-high (Beta cutoff)
+                    if is_quiet:
+                        # Cập nhật Killers và History
+                        km = self.killers[ply]
+                        mkey = mv._key
+                        if not km or km[0] != mkey:
+                            if mkey in km:
+                                km.remove(mkey)
+                            km.insert(0, mkey)
+                            del km[2:]
+                        self.history[mkey >> 6] += depth * depth
+                    cutoff = True
+                    break # Cắt tỉa
+
+                if score > alpha:
+                    alpha = score
+
+            if cutoff:
+                break
+
+        if move_index == 0:
+            # terminal: mate or stalemate (cả hai giai đoạn đều rỗng)
+            if in_check:
+                return -MATE_SCORE + ply
+            return 0
+
         # --- Store in TT ---
         flag = EXACT
         if best_score <= a0:
             flag = UPPER
         elif best_score >= beta:
             flag = LOWER
-        self.tt[key] = TTEntry(key=key, depth=depth, score=best_score, flag=flag, best_move=best_move)
-        
+        # Shallow non-root nodes are dominated by qsearch; storing them
+        # mostly churns slots, so only depth >= 2 (and the root) store
+        if depth >= 2 or ply == 0:
+            idx = key & TT_MASK
+            old = self.tt[idx]
+            # Depth-preferred: don't evict a clearly deeper entry for a
+            # different position with a shallow one. Entries from an
+            # earlier game (stale age) are always fair game
+            if old is None or old[0] == key or old[5] != self.age or depth >= old[1] - 2:
+                self.tt[idx] = (key, depth, best_score, flag,
+                                best_move._key if best_move is not None else 0,
+                                self.age)
+
+        return best_score
+
+    def _zws(self, pos, depth: int, beta: int, ply: int) -> int:
+        # Zero-window specialization of alphabeta: alpha is implicitly
+        # beta - 1, every child gets the same minimal window, and the
+        # PVS first-move branch, full-window re-search and root
+        # bookkeeping all disappear
+        alpha = beta - 1
+        if self.stop_requested:
+            self.out_of_time = True
+            return alpha
+        if self.nodes & 0xFFF == 0 and time.monotonic() > self.deadline:
+            self.out_of_time = True
+            return alpha
+        self.nodes += 1
+        stm = pos.side_to_move
+        key = pos.zobrist
+        tt = self.tt[key & TT_MASK]
+        if tt is not None and tt[0] != key:
+            tt = None
+
+        # --- TT Lookup ---
+        # With a unit window the bound checks collapse to two early-outs
+        if tt is not None and tt[1] >= depth:
+            tt_score = tt[2]
+            tt_flag = tt[3]
+            if tt_flag == EXACT:
+                return tt_score
+            if tt_flag == LOWER:
+                if tt_score >= beta:
+                    return tt_score
+            elif tt_score <= alpha:
+                return tt_score
+        tt_move_key = tt[4] if tt is not None else 0
+
+        in_check = self._in_check(pos, stm)
+        if depth <= 0:
+            return self.qsearch(pos, alpha, beta)
+
+        # --- Null-move pruning ---
+        if depth >= 2 and not in_check and self._has_non_pawn_material(pos, stm):
+            R = 3 if depth >= 5 else 2
+            null_state = pos.make_null_move()
+            score = -self._zws(pos, depth - R - 1, 1 - beta, ply + 1)
+            pos.undo_null_move(null_state)
+            if score >= beta:
+                return beta
+
+        best_score = -MATE_SCORE
+        best_move = None
+        stand_pat = evaluate(pos, alpha, beta) if depth <= 2 and not in_check else 0
+        move_index = 0
+        cutoff = False
+        see_cache: dict = {}
+
+        for stage_moves in (generate_captures(pos), None):
+            if stage_moves is None:
+                stage_moves = generate_quiets(pos)
+            if not stage_moves:
+                continue
+            scores = self._move_order(pos, stage_moves, tt_move_key, ply, see_cache)
+            n = len(stage_moves)
+
+            for i in range(n):
+                # Selection pick: đưa nước điểm cao nhất còn lại lên vị trí i
+                bi = i
+                bs = scores[i]
+                for j in range(i + 1, n):
+                    if scores[j] > bs:
+                        bs = scores[j]
+                        bi = j
+                if bi != i:
+                    stage_moves[i], stage_moves[bi] = stage_moves[bi], stage_moves[i]
+                    scores[i], scores[bi] = scores[bi], scores[i]
+                mv = stage_moves[i]
+                move_index += 1
+
+                reduce = False
+                r = 0
+                is_quiet = mv.quiet
+
+                if depth >= 3 and is_quiet and not in_check and move_index > 4:
+                    reduce = True
+                    r = 1
+
+                if depth <= 2 and not in_check and is_quiet:
+                    margin = 150 if depth == 1 else 250
+                    if stand_pat + margin <= alpha:
+                        reduce = True
+                        r = max(r, 1)
+
+                pos.make_move(mv)
+                score = -self._zws(pos, depth - 1 - r, -alpha, ply + 1)
+                pos.undo_move()
+
+                if reduce and score > alpha:
+                    pos.make_move(mv)
+                    score = -self._zws(pos, depth - 1, -alpha, ply + 1)
+                    pos.undo_move()
+
+                if score > best_score:
+                    best_score = score
+                    best_move = mv
+
+                if score >= beta:
+                    if is_quiet:
+                        km = self.killers[ply]
+                        mkey = mv._key
+                        if not km or km[0] != mkey:
+                            if mkey in km:
+                                km.remove(mkey)
+                            km.insert(0, mkey)
+                            del km[2:]
+                        self.history[mkey >> 6] += depth * depth
+                    cutoff = True
+                    break
+                # score > alpha without score >= beta is impossible in a
+                # unit window, so there is no alpha update here
+
+            if cutoff:
+                break
+
+        if move_index == 0:
+            if in_check:
+                return -MATE_SCORE + ply
+            return 0
+
+        # A zero-window result is always a bound, never exact
+        if depth >= 2:
+            idx = key & TT_MASK
+            old = self.tt[idx]
+            if old is None or old[0] == key or old[5] != self.age or depth >= old[1] - 2:
+                flag = LOWER if best_score >= beta else UPPER
+                self.tt[idx] = (key, depth, best_score, flag,
+                                best_move._key if best_move is not None else 0,
+                                self.age)
+
         return best_score
 
+    def _find_move_by_key(self, pos, move_key: int) -> Optional[Move]:
+        # Rebuild a Move from its packed TT key; scanning the legal moves
+        # also guards against stale/colliding entries
+        if not move_key:
+            return None
+        for mv in generate_legal_moves(pos):
+            if mv._key == move_key:
+                return mv
+        return None
+
     def get_pv(self, pos, max_len: int) -> List[Move]:
         # ... (Giữ nguyên hàm này)
         pv: List[Move] = []
         seen = set()
         while len(pv) < max_len:
-            tt = self.tt.get(pos.zobrist)
-            if tt is None or tt.best_move is None:
+            zkey = pos.zobrist
+            tt = self.tt[zkey & TT_MASK]
+            if tt is None or tt[0] != zkey:
+                break
+            mv = self._find_move_by_key(pos, tt[4])
+            if mv is None:
                 break
-            mv = tt.best_move
             # avoid loops
-            key = (mv.from_sq, mv.to_sq, mv.promotion)
-            if key in seen:
+            if mv._key in seen:
                 break
-            seen.add(key)
+            seen.add(mv._key)
             pv.append(mv)
             pos.make_move(mv)
         # undo applied PV moves
@@ -334,17 +562,23 @@ class Search:
         best_move = None
         score = 0
         self.nodes = 0
-        self.deadline = time.monotonic() + (time_ms / 1000.0) if time_ms else None
+        self.deadline = time.monotonic() + (time_ms / 1000.0) if time_ms else float('inf')
         self.stop_requested = False
         self.out_of_time = False
         start_time = time.monotonic()
         prev_score = 0
 
+        # Root progress wrapper, built once (not per depth iteration)
+        def root_progress_cb(mv: Move, idx: int, depth_now: int):
+            if progress_cb is not None:
+                elapsed = time.monotonic() - start_time
+                time_report = int(elapsed * 1000)
+                progress_cb(mv, idx, depth_now, self.nodes, time_report)
+
         for d in range(1, depth + 1):
-            # Decay history
-            if d % 2 == 0 and self.history:
-                for k in list(self.history.keys()):
-                    self.history[k] //= 2
+            # Decay history: one pass over the flat table
+            if d % 2 == 0:
+                self.history = [h >> 1 for h in self.history]
                     
             # Aspiration window
             if d > 1:
@@ -355,25 +589,19 @@ class Search:
                 a = -MATE_SCORE
                 b = MATE_SCORE
 
-            # Root progress wrapper
-            def root_progress_cb(mv: Move, idx: int, depth_now: int):
-                if progress_cb is not None:
-                    elapsed = time.monotonic() - start_time
-                    time_report = int(elapsed * 1000)
-                    progress_cb(mv, idx, depth_now, self.nodes, time_report)
-
             while True:
                 s = self.alphabeta(pos, d, a, b, ply=0, progress_cb=root_progress_cb)
                 
                 if self.out_of_time or self.stop_requested:
                     break
                     
-                # Emit bound info per attempt
+                # Emit bound info per attempt; the cached root move is
+                # enough here — no TT walk with make/undo per emission
                 if info_cb is not None:
                     elapsed = time.monotonic() - start_time
                     time_report = int(elapsed * 1000)
-                    pv_moves = self.get_pv(pos, max_len=d)
-                    
+                    pv_moves = self.root_pv
+
                 # Fail-low: widen lower bound
                 if s <= a and a > -MATE_SCORE:
                     if info_cb is not None:
@@ -395,9 +623,12 @@ class Search:
                 
             score = s
             prev_score = score
-            tt = self.tt.get(pos.zobrist)
-            if tt is not None and tt.best_move is not None:
-                best_move = tt.best_move
+            zkey = pos.zobrist
+            tt = self.tt[zkey & TT_MASK]
+            if tt is not None and tt[0] == zkey:
+                mv = self._find_move_by_key(pos, tt[4])
+                if mv is not None:
+                    best_move = mv
                 
             # emit per-iteration info
             if info_cb is not None:
@@ -406,7 +637,7 @@ class Search:
                 pv_moves = self.get_pv(pos, max_len=d)
                 info_cb(d, self.nodes, time_report, score, pv_moves, 'exact')
                 
-            if self.deadline is not None and time.monotonic() > self.deadline:
+            if time.monotonic() > self.deadline:
                 break
                 
         return best_move, score, self.nodes
\ No newline at end of file
@@ -1,255 +1,231 @@
-import sys
-import time
-import threading
-from typing import Optional
-
-from position import Position
-from search import Search, MATE_SCORE
-from moves import Move, generate_legal_moves
-import INITIAL_FEN
-
-
-def move_to_uci(m: Move) -> str:
-    s = f"{chr(ord('a') + (m.from_sq % 8))}{(m.from_sq // 8) + 1}{chr(ord('a') + (m.to_sq % 8))}{(m.to_sq // 8) + 1}"
-    if m.promotion is not None:
-        promo = 'q' if m.promotion % 6 == 4 else 'r' if m.promotion % 6 == 3 else 'b' if m.promotion % 6 == 2 else 'n'
-        s += promo
-    return s
-
-
-def find_legal_move(pos: Position, uci: str) -> Optional[Move]:
-    from_sq = (ord(uci[0]) - ord('a')) + (int(uci[1]) - 1) * 8
-    to_sq = (ord(uci[2]) - ord('a')) + (int(uci[3]) - 1) * 8
-    promo = None
-    if len(uci) == 5:
-        ch = uci[4]
-        promo = {'q': 4, 'r': 3, 'b': 2, 'n': 1}.get(ch)
-    for m in generate_legal_moves(pos):
-        if m.from_sq == from_sq and m.to_sq == to_sq and (promo is None or m.promotion == promo):
-            return m
-    return None
-
-
-def run_uci_loop():
-    pos = Position.from_fen(INITIAL_FEN)
-    search = Search()
-    search_thread: Optional[threading.Thread] = None
-
-    def start_search(depth: Optional[int], time_ms: Optional[int]):
-        nonlocal search_thread
-        # If a previous search is running, stop it first
-        if search_thread is not None and search_thread.is_alive():
-            search.request_stop()
-            search_thread.join()
-
-        def worker():
-            local_depth = depth if depth is not None else 10
-            start = time.monotonic()
-            # per-iteration info callback
-            def info_callback(d: int, nodes: int, ms: int, score: int, pv_moves: list[Move], bound: Optional[str] = None):
-                elapsed_s = ms / 1000.0 if ms > 0 else 0.0
-                nps = int(nodes / elapsed_s) if elapsed_s > 0 else nodes
-                # Report score: mate if near MATE_SCORE, else centipawns
-                if abs(score) > MATE_SCORE - 10000:
-                    mate_moves = (MATE_SCORE - abs(score) + 1) // 2
-                    mate_val = mate_moves if score > 0 else -mate_moves
-                    info_score = f"score mate {mate_val}"
-                else:
-                    info_score = f"score cp {score}"
-                if bound == 'upperbound':
-                    info_score += " upperbound"
-                elif bound == 'lowerbound':
-                    info_score += " lowerbound"
-                pv_str = ' '.join(move_to_uci(m) for m in pv_moves)
-                print(f"info depth {d} nodes {nodes} time {ms} nps {nps} {info_score} pv {pv_str}")
-                sys.stdout.flush()
-
-            # root move progress callback
-            def progress_callback(mv: Move, idx: int, d: int, nodes: int, ms: int):
-                elapsed_s = ms / 1000.0 if ms > 0 else 0.0
-                nps = int(nodes / elapsed_s) if elapsed_s > 0 else nodes
-                print(f"info currmove {move_to_uci(mv)} currmovenumber {idx} depth {d} nodes {nodes} time {ms} nps {nps}")
-                sys.stdout.flush()
-
-            best, score, nodes = search.search(pos, depth=local_depth, time_ms=time_ms, info_cb=info_callback, progress_cb=progress_callback)
-            elapsed = (time.monotonic() - start)
-            time_report = int(elapsed * 1000)
-            nps = int(nodes / elapsed) if elapsed > 0 else nodes
-
-            # Report score: mate if near MATE_SCORE, else centipawns
-            info_score = ''
-            if abs(score) > MATE_SCORE - 10000:
-                sign = 1 if score > 0 else -1
-                mate_dist = sign * (MATE_SCORE - abs(score))
-                info_score = f"score mate {mate_dist}"
-            else:
-                info_score = f"score cp {score}"
-
-            pv_moves = search.get_pv(pos, max_len=local_depth)
-            pv_str = ' '.join(move_to_uci(m) for m in pv_moves)
-            print(f"info depth {local_depth} nodes {nodes} time {time_report} nps {nps} {info_score} pv {pv_str}")
-            sys.stdout.flush()
-            if best is None:
-                print("bestmove 0000")
-            else:
-                print(f"bestmove {move_to_uci(best)}")
-            sys.stdout.flush()
-
-        search_thread = threading.Thread(target=worker, daemon=True)
-        search_thread.start()
-
-    while True:
-        line = sys.stdin.readline()
-        if not line:
-            break
-        line = line.strip()
-        if line == 'uci':
-            print('id name SunfishPro')
-            print('id author TraeAI')
-            print('uciok')
-            sys.stdout.flush()
-            continue
-        if line == 'isready':
-            print('readyok')
-            sys.stdout.flush()
-            continue
-        if line == 'ucinewgame':
-            # stop any running search
-            if search_thread is not None and search_thread.is_alive():
-                search.request_stop()
-                search_thread.join()
-            pos = Position.from_fen(INITIAL_FEN)
-            search.tt.clear()
-            search.killers.clear()
-            search.history.clear()
-            continue
-        if line.startswith('position'):
-            # position [fen <fenstring> | startpos ] moves <move1> .... <movei>
-            parts = line.split()
-            idx = 1
-            if idx < len(parts) and parts[idx] == 'startpos':
-                pos = Position.from_fen(INITIAL_FEN)
-                idx += 1
-            elif idx < len(parts) and parts[idx] == 'fen':
-                fen = ' '.join(parts[idx + 1:])
-                # FEN may end before 'moves'
-                fen_parts = fen.split(' moves')
-                fen = fen_parts[0].strip()
-                pos = Position.from_fen(fen)
-                if len(fen_parts) > 1:
-                    moves_str = fen_parts[1].strip()
-                    moves_list = moves_str.split()
-                    for u in moves_list:
-                        m = find_legal_move(pos, u)
-                        if m:
-                            pos.make_move(m)
-                continue
-            # Apply subsequent moves if any
-            if idx < len(parts) and parts[idx] == 'moves':
-                for u in parts[idx + 1:]:
-                    m = find_legal_move(pos, u)
-                    if m:
-                        pos.make_move(m)
-            continue
-        if line.startswith('go'):
-            # go depth N | go movetime M | go wtime WT btime BT winc WI binc BI [movestogo MT]
-            tokens = line.split()
-            depth = None
-            movetime = None
-            wtime = btime = winc = binc = movestogo = None
-            i = 1
-            while i < len(tokens):
-                t = tokens[i]
-                if t == 'depth':
-                    depth = int(tokens[i + 1])
-                    i += 2
-                elif t == 'movetime':
-                    movetime = int(tokens[i + 1])
-                    i += 2
-                elif t == 'wtime':
-                    wtime = int(tokens[i + 1])
-                    i += 2
-                elif t == 'btime':
-                    btime = int(tokens[i + 1])
-                    i += 2
-                elif t == 'winc':
-                    winc = int(tokens[i + 1])
-                    i += 2
-                elif t == 'binc':
-                    binc = int(tokens[i + 1])
-                    i += 2
-                elif t == 'movestogo':
-                    movestogo = int(tokens[i + 1])
-                    i += 2
-                else:
-                    i += 1
-
-            time_ms = None
-            if movetime is not None:
-                time_ms = movetime
-            elif wtime is not None and btime is not None:
-                # simple time management: allocate a fraction of remaining time
-                remaining = wtime if pos.side_to_move == 0 else btime
-                inc = winc if pos.side_to_move == 0 else binc
-                mtg = movestogo if movestogo is not None else 30
-                base = remaining / max(mtg, 1)
-                budget = base + (inc or 0) * 0.8
-                # keep a small safety margin
-                time_ms = int(max(1, budget * 0.8))
-
-            start_search(depth, time_ms)
-            continue
-        if line == 'stop':
-            if search_thread is not None and search_thread.is_alive():
-                search.request_stop()
-                search_thread.join()
-            continue
-        if line == 'quit':
-            if search_thread is not None and search_thread.is_alive():
-                search.request_stop()
-                search_thread.join()
-            break
-
-
-if __name__ == '__main__':
-    run_uci_loop()
-
-
-    def start_search(args):
-        pos, depth, movetime = args
-        search = Search()
-        start = time.monotonic()
-
-        def info_callback(d: int, nodes: int, time_ms: int, score: int, pv_moves: list[Move], bound: Optional[str] = None):
-            # Compute NPS safely
-            nps = int(nodes * 1000 / max(time_ms, 1))
-            # Score formatting: cp or mate
-            MATE_SCORE = 1000000
-            score_str: str
-            if abs(score) > MATE_SCORE - 10000:
-                # Convert mate score to moves-to-mate (approximate from score)
-                # UCI expects 'score mate N' where N > 0 is mate for side to move
-                # and N < 0 is mate for the opponent.
-                mate_moves = (MATE_SCORE - abs(score) + 1) // 2
-                mate_val = mate_moves if score > 0 else -mate_moves
-                score_str = f"score mate {mate_val}"
-            else:
-                score_str = f"score cp {score}"
-            if bound == 'upperbound':
-                score_str += " upperbound"
-            elif bound == 'lowerbound':
-                score_str += " lowerbound"
-            # PV formatting
-            pv_str = " ".join(mv.uci() for mv in pv_moves) if pv_moves else ""
-            print(f"info depth {d} nodes {nodes} time {time_ms} nps {nps} {score_str} pv {pv_str}", flush=True)
-
-        def progress_callback(mv: Move, idx: int, depth_now: int, nodes: int, time_ms: int):
-            nps = int(nodes * 1000 / max(time_ms, 1))
-            print(f"info currmove {mv.uci()} currmovenumber {idx} depth {depth_now} nodes {nodes} time {time_ms} nps {nps}", flush=True)
-
-        best, score, nodes = search.search(pos, depth=depth, time_ms=movetime, info_cb=info_callback, progress_cb=progress_callback)
-        elapsed = int((time.monotonic() - start) * 1000)
-        nps = int(nodes * 1000 / max(elapsed, 1))
-        print(f"info depth {depth} nodes {nodes} time {elapsed} nps {nps}", flush=True)
-        bm = best.uci() if best else "0000"
-        print(f"bestmove {bm}", flush=True)
\ No newline at end of file
+import os
+import sys
+import time
+import threading
+from typing import Optional
+
+from position import Position
+from search import Search, MATE_SCORE
+from moves import Move, generate_legal_moves_from
+from constants import INITIAL_FEN
+
+
+# Square names and promotion letters, precomputed so move_to_uci is two
+# table lookups instead of chr/ord arithmetic per call
+SQ_NAMES = [chr(ord('a') + (s % 8)) + str(s // 8 + 1) for s in range(64)]
+UCI_TO_SQ = {name: s for s, name in enumerate(SQ_NAMES)}
+PROMO_CHAR = {4: 'q', 3: 'r', 2: 'b', 1: 'n'}
+CHAR_PROMO = {'q': 4, 'r': 3, 'b': 2, 'n': 1}
+
+# Scores beyond this are mate-in-N, not centipawns
+MATE_BOUND = MATE_SCORE - 10000
+
+# Static handshake replies, prebuilt as bytes and written past the text
+# encoder
+_UCI_HELLO = b'id name SunfishPro\nid author TraeAI\nuciok\n'
+_READYOK = b'readyok\n'
+
+# go sub-keywords that take one integer argument
+GO_KEYS = frozenset(('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo'))
+
+
+if os.name == 'posix':
+    def _emit(line: str) -> None:
+        # One write(2) per line, past the TextIOWrapper lock and encoder;
+        # info lines are far below PIPE_BUF so the write is atomic
+        os.write(1, (line + '\n').encode('ascii'))
+else:
+    def _emit(line: str) -> None:
+        print(line, flush=True)
+
+
+def move_to_uci(m: Move) -> str:
+    s = SQ_NAMES[m.from_sq] + SQ_NAMES[m.to_sq]
+    if m.promotion is not None:
+        s += PROMO_CHAR[m.promotion % 6]
+    return s
+
+
+def find_legal_move(pos: Position, uci: str) -> Optional[Move]:
+    from_sq = UCI_TO_SQ[uci[0:2]]
+    to_sq = UCI_TO_SQ[uci[2:4]]
+    promo = CHAR_PROMO.get(uci[4]) if len(uci) == 5 else None
+    # Only the moves leaving from_sq are legality-checked; promotions
+    # compare side-independently (% 6) against the UCI suffix letter,
+    # defaulting to queen when no suffix is given
+    fallback = None
+    for m in generate_legal_moves_from(pos, from_sq):
+        if m.to_sq != to_sq:
+            continue
+        mp = None if m.promotion is None else m.promotion % 6
+        if mp == promo:
+            return m
+        if promo is None and mp == 4:
+            fallback = m
+    return fallback
+
+
+def run_uci_loop():
+    # Line-buffered stdout: every print ends with a newline, so info
+    # traffic no longer needs an explicit flush per line
+    sys.stdout.reconfigure(line_buffering=True)
+    pos = Position.from_fen(INITIAL_FEN)
+    search = Search()
+    search_thread: Optional[threading.Thread] = None
+
+    def start_search(depth: Optional[int], time_ms: Optional[int]):
+        nonlocal search_thread
+        # If a previous search is running, stop it first
+        if search_thread is not None and search_thread.is_alive():
+            search.request_stop()
+            search_thread.join()
+
+        def worker():
+            local_depth = depth if depth is not None else 10
+            # Last exact info line, kept so the pre-bestmove report can
+            # reuse it instead of rebuilding the PV from the TT
+            last_info: Optional[str] = None
+            # per-iteration info callback
+            def info_callback(d: int, nodes: int, ms: int, score: int, pv_moves: list[Move], bound: Optional[str] = None):
+                nonlocal last_info
+                elapsed_s = ms / 1000.0 if ms > 0 else 0.0
+                nps = int(nodes / elapsed_s) if elapsed_s > 0 else nodes
+                # Report score: mate if near MATE_SCORE, else centipawns
+                if score > MATE_BOUND:
+                    info_score = f"score mate {(MATE_SCORE - score + 1) // 2}"
+                elif score < -MATE_BOUND:
+                    info_score = f"score mate {-((MATE_SCORE + score + 1) // 2)}"
+                else:
+                    info_score = f"score cp {score}"
+                if bound == 'upperbound':
+                    info_score += " upperbound"
+                elif bound == 'lowerbound':
+                    info_score += " lowerbound"
+                pv_str = ' '.join(move_to_uci(m) for m in pv_moves)
+                line = f"info depth {d} nodes {nodes} time {ms} nps {nps} {info_score} pv {pv_str}"
+                if bound is None or bound == 'exact':
+                    last_info = line
+                _emit(line)
+
+            # root move progress callback
+            def progress_callback(mv: Move, idx: int, d: int, nodes: int, ms: int):
+                elapsed_s = ms / 1000.0 if ms > 0 else 0.0
+                nps = int(nodes / elapsed_s) if elapsed_s > 0 else nodes
+                _emit(f"info currmove {move_to_uci(mv)} currmovenumber {idx} depth {d} nodes {nodes} time {ms} nps {nps}")
+
+            best, score, nodes = search.search(pos, depth=local_depth, time_ms=time_ms, info_cb=info_callback, progress_cb=progress_callback)
+            # Echo the last completed iteration's line; walking the TT
+            # again here could even report a PV that no longer matches
+            # the returned best move
+            if last_info is not None:
+                _emit(last_info)
+            if best is None:
+                _emit("bestmove 0000")
+            else:
+                _emit(f"bestmove {move_to_uci(best)}")
+
+        search_thread = threading.Thread(target=worker, daemon=True)
+        search_thread.start()
+
+    def stop_running_search():
+        if search_thread is not None and search_thread.is_alive():
+            search.request_stop()
+            search_thread.join()
+
+    def handle_uci(rest: str):
+        sys.stdout.flush()
+        sys.stdout.buffer.write(_UCI_HELLO)
+        sys.stdout.buffer.flush()
+
+    def handle_isready(rest: str):
+        sys.stdout.flush()
+        sys.stdout.buffer.write(_READYOK)
+        sys.stdout.buffer.flush()
+
+    def handle_ucinewgame(rest: str):
+        nonlocal pos
+        stop_running_search()
+        pos = Position.from_fen(INITIAL_FEN)
+        # Ages out the TT in O(1) and resets killers/history
+        search.new_game()
+
+    def handle_position(rest: str):
+        # position [fen <fenstring> | startpos ] moves <move1> .... <movei>
+        # Single pass: locate ' moves ' once, split only the tail
+        nonlocal pos
+        mv_at = rest.find(' moves ')
+        if mv_at >= 0:
+            setup, moves_str = rest[:mv_at], rest[mv_at + 7:]
+        elif rest.endswith(' moves'):
+            setup, moves_str = rest[:-6], ''
+        else:
+            setup, moves_str = rest, ''
+        setup = setup.strip()
+        if setup == 'startpos':
+            pos = Position.from_fen(INITIAL_FEN)
+        elif setup.startswith('fen '):
+            pos = Position.from_fen(setup[4:].strip())
+        for u in moves_str.split():
+            m = find_legal_move(pos, u)
+            if m:
+                pos.make_move(m)
+
+    def handle_go(rest: str):
+        # go depth N | go movetime M | go wtime WT btime BT winc WI binc BI [movestogo MT]
+        params = {}
+        it = iter(rest.split())
+        for t in it:
+            if t in GO_KEYS:
+                params[t] = int(next(it))
+        depth = params.get('depth')
+        movetime = params.get('movetime')
+        wtime = params.get('wtime')
+        btime = params.get('btime')
+        winc = params.get('winc')
+        binc = params.get('binc')
+        movestogo = params.get('movestogo')
+
+        time_ms = None
+        if movetime is not None:
+            time_ms = movetime
+        elif wtime is not None and btime is not None:
+            # simple time management: allocate a fraction of remaining time
+            stm = pos.side_to_move
+            remaining = wtime if stm == 0 else btime
+            inc = (winc if stm == 0 else binc) or 0
+            mtg = movestogo if movestogo is not None else 30
+            base = remaining / max(mtg, 1)
+            budget = base + inc * 0.8
+            # keep a small safety margin
+            time_ms = int(max(1, budget * 0.8))
+
+        start_search(depth, time_ms)
+
+    def handle_stop(rest: str):
+        # Don't join: blocking here would stall the read loop while the
+        # worker drains. It prints bestmove and exits on its own; a
+        # following go or quit still joins via stop_running_search
+        search.request_stop()
+
+    # One dict lookup on the first token instead of a startswith chain
+    dispatch = {
+        'uci': handle_uci,
+        'isready': handle_isready,
+        'ucinewgame': handle_ucinewgame,
+        'position': handle_position,
+        'go': handle_go,
+        'stop': handle_stop,
+    }
+
+    for line in sys.stdin:
+        cmd, _, rest = line.strip().partition(' ')
+        if cmd == 'quit':
+            stop_running_search()
+            break
+        handler = dispatch.get(cmd)
+        if handler is not None:
+            handler(rest)
+
+
+if __name__ == '__main__':
+    run_uci_loop()
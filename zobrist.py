@@ -1,41 +1,67 @@
-import random
+_MASK64 = (1 << 64) - 1
 
 
-def _iter_bits(bb: int):
-    while bb:
-        lsb = bb & -bb
-        sq = lsb.bit_length() - 1
-        yield sq
-        bb &= bb - 1
+def _splitmix64_keys(seed: int, count: int) -> list:
+    # Deterministic 64-bit key stream: two multiplies and a few shifts
+    # per key, no Mersenne Twister state to spin up at import
+    keys = []
+    state = seed
+    for _ in range(count):
+        state = (state + 0x9E3779B97F4A7C15) & _MASK64
+        z = state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        keys.append(z ^ (z >> 31))
+    return keys
 
 
 class Zobrist:
     def __init__(self, seed: int = 2021):
-        rng = random.Random(seed)
-        # 12 piece types x 64 squares
-        self.piece_square = [[rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
-        self.side = rng.getrandbits(64)
+        # 12 piece types x 64 squares, then side, castling, ep files
+        keys = _splitmix64_keys(seed, 12 * 64 + 1 + 4 + 8)
+        # Piece-square keys as one flat immutable tuple ((p << 6) | sq)
+        # for the single-index loop in compute()...
+        self._ps = tuple(keys[:768])
+        # ...and as nested tuple rows for the incremental make/undo
+        # updates, which index ps[piece][sq]
+        self.piece_square = tuple(self._ps[p * 64:(p + 1) * 64] for p in range(12))
+        self.side = keys[768]
         # Castling keys: WK, WQ, BK, BQ
-        self.castling_keys = [rng.getrandbits(64) for _ in range(4)]
+        self.castling_keys = tuple(keys[769:773])
         # EP file keys: a..h
-        self.ep_file_keys = [rng.getrandbits(64) for _ in range(8)]
+        self.ep_file_keys = tuple(keys[773:781])
+        # Per-square view with a "no ep" sentinel at index 64, so the ep
+        # contribution is one unconditional XOR
+        self.ep_hash = tuple(self.ep_file_keys[sq % 8] for sq in range(64)) + (0,)
+        # castling_xor_table[mask]: XOR of the castling keys whose rights
+        # bits are set in mask, so a rights change is a single lookup
+        xor_table = [0] * 16
+        for mask in range(16):
+            h = 0
+            for i in range(4):
+                if (mask >> i) & 1:
+                    h ^= self.castling_keys[i]
+            xor_table[mask] = h
+        self.castling_xor_table = tuple(xor_table)
 
     def compute(self, pos) -> int:
+        """Full O(pieces) hash of `pos` from scratch.
+
+        Slow path: used once in Position.from_fen and as a reference when
+        debugging the incremental updates in make_move/undo_move, which
+        keep pos.zobrist current with a handful of XORs per move.
+        """
         h = 0
+        ps = self._ps
         for p in range(12):
-            for sq in _iter_bits(pos.bitboards[p]):
-                h ^= self.piece_square[p][sq]
+            base = p << 6
+            bb = pos.bitboards[p]
+            while bb:
+                h ^= ps[base | ((bb & -bb).bit_length() - 1)]
+                bb &= bb - 1
         if pos.side_to_move == 1:
             h ^= self.side
-        cr = pos.castling_rights
-        if cr & 1:
-            h ^= self.castling_keys[0]
-        if cr & 2:
-            h ^= self.castling_keys[1]
-        if cr & 4:
-            h ^= self.castling_keys[2]
-        if cr & 8:
-            h ^= self.castling_keys[3]
-        if pos.ep_square is not None:
-            h ^= self.ep_file_keys[pos.ep_square % 8]
+        h ^= self.castling_xor_table[pos.castling_rights & 15]
+        ep = pos.ep_square
+        h ^= self.ep_hash[64 if ep is None else ep]
         return h
\ No newline at end of file